@@ -2295,6 +2295,10 @@ def debug_set_low_prices(request):
         
         # Update all active products to the target price
         updated = Product.objects.filter(status='active').update(price=target_price)
+        # Bulk update bypasses model signals
+        from products.catalog import bump_catalog_version, invalidate_all_product_details
+        bump_catalog_version()
+        invalidate_all_product_details()
         
         return Response({
             'message': f'Updated {updated} products to price {target_price} MZN',
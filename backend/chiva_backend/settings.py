@@ -60,6 +60,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     "django_filters",
@@ -173,6 +174,12 @@ REST_FRAMEWORK = {
         'chiva_backend.firebase_auth.FirebaseAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Multipart bodies go through the streaming image upload checks
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'products.upload_handlers.ImageMultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -218,14 +225,72 @@ STATIC_ROOT = config('STATIC_ROOT', default=BASE_DIR / 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = config('MEDIA_ROOT', default='/var/lib/media' if not DEBUG else str(BASE_DIR / 'media'))
 
+# Uploads are stored under the hash of their content so identical files are
+# kept once (see products.storage)
+STORAGES = {
+    'default': {'BACKEND': 'products.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Cache
+# Holds rendered catalog bodies (product details, facets, review summaries).
+# The versions that key them live in the database (products.CatalogVersion),
+# so a per-container file-based cache is safe: a bump made by the image
+# worker reaches the web container, and culling only drops bodies.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default='' if DEBUG else str(BASE_DIR / '.cache')),
+    }
+}
+
+# Product view counter (products.view_counter): views are queued as rows and
+# flush_product_views adds them to view_count at most this many seconds
+# later, in UPDATEs of up to PRODUCT_VIEW_FLUSH_BATCH views. Queued views
+# survive worker crashes, so no loss tolerance needs tuning.
+PRODUCT_VIEW_FLUSH_INTERVAL = config('PRODUCT_VIEW_FLUSH_INTERVAL', default=60, cast=int)
+PRODUCT_VIEW_FLUSH_BATCH = config('PRODUCT_VIEW_FLUSH_BATCH', default=5000, cast=int)
+
+# Upper bounds (MZN) of the price ranges counted by /api/products/facets/;
+# a last open-ended range starts at the final bound
+PRODUCT_PRICE_FACET_BOUNDS = config(
+    'PRODUCT_PRICE_FACET_BOUNDS',
+    default='500,1000,2500,5000,10000',
+    cast=lambda v: [int(bound) for bound in v.split(',') if bound.strip()]
+)
+
 # File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 100MB
+# Uploads stream to temporary files in chunks and are checked against the
+# limits below as they arrive (see products.upload_handlers), so no upload
+# is held in worker memory. The in-memory cap only covers the non-file
+# part of a request body.
+FILE_UPLOAD_HANDLERS = ['products.upload_handlers.StreamingImageUploadHandler']
+FILE_UPLOAD_TEMP_DIR = config('FILE_UPLOAD_TEMP_DIR', default=None)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB (Django default)
 
 # Allowed file extensions for uploads
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Processes used by process_image_jobs to decode/resize images in parallel
+# (capped at the number of CPUs)
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
+# Per-width WebP encoder overrides, e.g. {1024: {'quality': 75, 'method': 3}};
+# defaults live in products.image_utils.DEFAULT_VARIANT_ENCODING
+IMAGE_VARIANT_ENCODING = {}
+
+# On-demand resize endpoint (products.image_resize): allowed widths, and the
+# disk cache of renditions with its LRU byte budget, enforced at most once
+# per IMAGE_RESIZE_EVICT_INTERVAL seconds
+IMAGE_RESIZE_WIDTHS = [320, 480, 640, 768, 1024, 1440, 1920]
+IMAGE_RESIZE_CACHE_DIR = config('IMAGE_RESIZE_CACHE_DIR', default=os.path.join(MEDIA_ROOT, '.resized'))
+IMAGE_RESIZE_CACHE_BYTES = config('IMAGE_RESIZE_CACHE_BYTES', default=512 * 1024 * 1024, cast=int)
+IMAGE_RESIZE_EVICT_INTERVAL = config('IMAGE_RESIZE_EVICT_INTERVAL', default=300, cast=int)
+
 # Trusted origins for CSRF (add https://yourdomain and http://ip if needed)
 CSRF_TRUSTED_ORIGINS = config('CSRF_TRUSTED_ORIGINS', default='https://mutitpay.com', cast=lambda v: [origin.strip() for origin in v.split(',')])
 
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
 from django.contrib import messages
-from .models import Category, Product, Color, Size, ProductImage, Favorite, Review
+from .models import Category, Product, Color, Size, ProductImage, Favorite, Review, ImageVariantJob, ImageBlob
+from .moderation import moderate_reviews
 
 
 @admin.register(Color)
@@ -131,6 +132,30 @@ class ProductImageAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Preview'
 
 
+@admin.register(ImageVariantJob)
+class ImageVariantJobAdmin(admin.ModelAdmin):
+    list_display = ['image', 'status', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['image']
+    readonly_fields = ['image', 'status', 'attempts', 'last_error', 'started_at', 'finished_at', 'created_at', 'updated_at']
+    actions = ['requeue_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue_jobs(self, request, queryset):
+        """Send failed or stuck jobs back to the queue"""
+        updated = queryset.exclude(status=ImageVariantJob.STATUS_DONE).update(
+            status=ImageVariantJob.STATUS_PENDING,
+            attempts=0,
+            last_error='',
+            started_at=None,
+            finished_at=None,
+        )
+        self.message_user(request, f'{updated} tarefa(s) reenviada(s) para a fila.', messages.SUCCESS)
+    requeue_jobs.short_description = 'Reenviar para a fila'
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'created_at']
@@ -179,11 +204,7 @@ class ReviewAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(
-            status='approved',
-            moderated_by=request.user,
-            moderated_at=timezone.now()
-        )
+        updated, _, _ = moderate_reviews(queryset, 'approved', request.user)
         self.message_user(
             request,
             f'{updated} avaliação(ões) aprovada(s) com sucesso.',
@@ -192,14 +213,21 @@ class ReviewAdmin(admin.ModelAdmin):
     approve_reviews.short_description = "Aprovar avaliações selecionadas"
     
     def reject_reviews(self, request, queryset):
-        updated = queryset.update(
-            status='rejected',
-            moderated_by=request.user,
-            moderated_at=timezone.now()
-        )
+        updated, _, _ = moderate_reviews(queryset, 'rejected', request.user)
         self.message_user(
             request,
             f'{updated} avaliação(ões) rejeitada(s).',
             messages.SUCCESS
         )
     reject_reviews.short_description = "Rejeitar avaliações selecionadas"
+
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at', 'updated_at']
+    list_filter = ['created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'ref_count', 'created_at', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
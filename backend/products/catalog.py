@@ -0,0 +1,295 @@
+"""
+Catalog read helpers
+Shared querysets used by the public product listing endpoints, the catalog
+version used for conditional (ETag / Last-Modified) responses and the
+per-slug product detail cache.
+
+The versions live in the CatalogVersion table, not the cache: the cache is
+local to each container, and a bump made by the image worker must reach
+the web container's ETags and detail cache keys.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import CatalogVersion, Product, ProductImage, ReviewHelpfulVote
+
+CATALOG_VERSION_KEY = 'catalog'
+PRODUCT_DETAIL_GENERATION_KEY = 'product-detail:generation'
+SUGGEST_VERSION_KEY = 'suggest'
+PRODUCT_DETAIL_TIMEOUT = 60 * 10
+
+
+def main_image_subquery(field='image'):
+    """Subquery returning ``field`` of a product's main image (its storage path by default).
+
+    Mirrors Product.get_main_image(): the ProductImage flagged as main wins,
+    otherwise the first image by display order. Products without gallery
+    images get NULL and fall back to the legacy main_image field.
+    """
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef('pk'))
+        .order_by('-is_main', 'order', 'created_at')
+        .values(field)[:1]
+    )
+
+
+def catalog_queryset(queryset=None):
+    """Return a product queryset ready for ProductListSerializer.
+
+    Joins category/subcategory, annotates ``main_image_path`` and
+    ``main_image_variants`` (its variant manifest) and prefetches
+    colors/sizes so a page of product cards is served in a constant number
+    of queries regardless of its size.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.select_related(
+        'category',
+        'subcategory',
+    ).prefetch_related(
+        'colors',
+        'sizes',
+    ).annotate(
+        main_image_path=main_image_subquery(),
+        main_image_variants=main_image_subquery('variants'),
+    )
+
+
+def _now_and_on_commit(func):
+    """Run a cache invalidation now and again once the transaction commits.
+
+    The second run covers readers that rendered pre-commit data under the
+    first new version while the writing transaction was still open.
+    """
+    func()
+    transaction.on_commit(func)
+
+
+def _catalog_now():
+    return int(time.time() * 1000)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _read_versions(*names):
+    """Current value of each named CatalogVersion; missing counters read as 0.
+
+    Reads never write: a counter's row is created the first time something
+    bumps it, so requests for unknown slugs leave nothing behind.
+    """
+    versions = dict(CatalogVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return {name: versions.get(name, 0) for name in names}
+
+
+def _set_versions(names):
+    """Give every counter in ``names`` a fresh version, creating missing ones."""
+    version = _new_version()
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(name=name, version=version) for name in names],
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=['version'],
+    )
+
+
+def get_catalog_version(request=None):
+    """Return the current catalog version (milliseconds since the epoch).
+
+    The version is the time of the last catalog change, read from the
+    CatalogVersion table so web and worker containers agree on it. Passing
+    the request memoizes it, so the ETag and Last-Modified of one response
+    cost a single query.
+    """
+    if request is not None and hasattr(request, '_catalog_version'):
+        return request._catalog_version
+    version = _read_versions(CATALOG_VERSION_KEY)[CATALOG_VERSION_KEY]
+    if request is not None:
+        request._catalog_version = version
+    return version
+
+
+def _bump_catalog_version():
+    now = _catalog_now()
+    updated = CatalogVersion.objects.filter(name=CATALOG_VERSION_KEY).update(
+        version=Greatest(Value(now), F('version') + 1000),
+    )
+    if not updated:
+        CatalogVersion.objects.bulk_create(
+            [CatalogVersion(name=CATALOG_VERSION_KEY, version=now)], ignore_conflicts=True,
+        )
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed; called from model signals.
+
+    Each bump moves the version at least one second forward so the
+    second-resolution Last-Modified header always changes with it. It runs
+    once the transaction commits: a reader that saw the old version before
+    then also saw the old data, and holding the counter's row lock for the
+    rest of a transaction would serialize every catalog writer.
+    """
+    transaction.on_commit(_bump_catalog_version)
+
+
+def get_suggest_version():
+    """Version of the data behind search suggestions.
+
+    Moves only when a product or category appears, disappears or is
+    renamed, so reviews, votes and image manifests don't force every
+    worker to rebuild its suggest index.
+    """
+    return _read_versions(SUGGEST_VERSION_KEY)[SUGGEST_VERSION_KEY]
+
+
+def bump_suggest_version():
+    """Mark the suggest index as stale once the transaction commits."""
+    transaction.on_commit(lambda: _set_versions([SUGGEST_VERSION_KEY]))
+
+
+def _audience(request):
+    user = getattr(request, 'user', None)
+    return f'user:{user.pk}' if user is not None and user.is_authenticated else 'public'
+
+
+def _version_time(*versions_ms):
+    return datetime.fromtimestamp(max(versions_ms) / 1000, tz=dt_timezone.utc)
+
+
+def catalog_etag(request, *args, **kwargs):
+    """Strong ETag for a catalog read: version + full URL + audience.
+
+    Staff see inactive products and detail payloads carry per-user review
+    flags, so authenticated users get their own tag for the same URL.
+    """
+    raw = f'{get_catalog_version(request)}:{request.get_full_path()}:{_audience(request)}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _version_time(get_catalog_version(request))
+
+
+def _conditional(view_func, etag_func, last_modified_func):
+    conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+    return wrapper
+
+
+def catalog_conditional(view_func):
+    """Answer catalog GETs with 304 when the client's copy is current.
+
+    The ETag/Last-Modified check runs before the view, so a matching
+    If-None-Match costs one version lookup and no serialization. Responses
+    are marked ``no-cache`` so clients always revalidate instead of
+    heuristically caching on Last-Modified.
+    """
+    return _conditional(view_func, catalog_etag, catalog_last_modified)
+
+
+def _detail_version_key(slug):
+    return f'product-detail:version:{slug}'
+
+
+def product_detail_versions(request, slug):
+    """``(slug version, generation)`` of a product's detail body.
+
+    Read together with the catalog version and memoized on the request, so
+    the conditional check and the cache key of one detail response share a
+    single query.
+    """
+    memo = getattr(request, '_product_detail_versions', None)
+    if memo is not None and memo[0] == slug:
+        return memo[1]
+    version_key = _detail_version_key(slug)
+    versions = _read_versions(CATALOG_VERSION_KEY, version_key, PRODUCT_DETAIL_GENERATION_KEY)
+    request._catalog_version = versions[CATALOG_VERSION_KEY]
+    pair = (versions[version_key], versions[PRODUCT_DETAIL_GENERATION_KEY])
+    request._product_detail_versions = (slug, pair)
+    return pair
+
+
+def product_detail_etag(request, *args, slug=None, **kwargs):
+    """catalog_etag plus the product's own detail versions.
+
+    Changes scoped to one product (e.g. a helpful vote on one of its
+    reviews) only move its detail version, not the catalog's.
+    """
+    version, generation = product_detail_versions(request, slug)
+    raw = f'{catalog_etag(request)}:{version}:{generation}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def product_detail_last_modified(request, *args, slug=None, **kwargs):
+    # Detail versions are time_ns() of the last invalidation
+    version, generation = product_detail_versions(request, slug)
+    return _version_time(get_catalog_version(request), version // 10 ** 6, generation // 10 ** 6)
+
+
+def product_detail_conditional(view_func):
+    """catalog_conditional for a product detail, also keyed on its detail versions."""
+    return _conditional(view_func, product_detail_etag, product_detail_last_modified)
+
+
+def product_detail_cache_key(request, slug):
+    """Cache key for a product detail body.
+
+    Built from the slug's own version plus a global generation (bumped by
+    changes that touch many products at once, such as renaming a category).
+    Invalidation mints new versions instead of deleting keys, so a body
+    rendered concurrently with a write lands under a version no reader will
+    ask for again.
+    """
+    version, generation = product_detail_versions(request, slug)
+    # Serialized URLs are absolute, so the origin is part of the key
+    origin = request.build_absolute_uri('/')
+    raw = f'{slug}:{version}:{generation}:{origin}'
+    return 'product-detail:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def invalidate_product_detail(*slugs):
+    """Drop cached detail bodies for the given product slugs (on commit)."""
+    keys = sorted({_detail_version_key(slug) for slug in slugs if slug})
+    if keys:
+        transaction.on_commit(lambda: _set_versions(keys))
+
+
+def invalidate_all_product_details():
+    """Drop every cached detail body (bulk updates, shared lookups), on commit."""
+    transaction.on_commit(lambda: _set_versions([PRODUCT_DETAIL_GENERATION_KEY]))
+
+
+def overlay_review_flags(data, user):
+    """Apply per-user review fields to a cached product detail body.
+
+    Cached bodies are shared by every visitor, so ``user_has_voted_helpful``
+    is recomputed here with a single query for the embedded reviews.
+    """
+    reviews = data.get('reviews') or []
+    if not reviews:
+        return data
+    voted = set()
+    if user is not None and user.is_authenticated:
+        voted = set(ReviewHelpfulVote.objects.filter(
+            user=user,
+            review_id__in=[review['id'] for review in reviews],
+        ).values_list('review_id', flat=True))
+    data = dict(data)
+    data['reviews'] = [dict(review, user_has_voted_helpful=review['id'] in voted) for review in reviews]
+    return data
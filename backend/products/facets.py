@@ -0,0 +1,116 @@
+"""
+Product facet counts
+Counts per brand, subcategory, color, size and price range for a filtered
+product queryset, computed in two queries:
+
+1. one GROUP BY (brand, subcategory) pass over the products, with the price
+   ranges counted by conditional aggregation (COUNT ... FILTER);
+2. one UNION of the color and size link tables grouped by value.
+
+Results are cached under the catalog version plus the filter signature.
+"""
+
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Value, CharField
+
+from .catalog import get_catalog_version
+from .models import Product
+
+FACETS_TIMEOUT = 60 * 5
+
+# Params that page or order the listing without changing which products match
+NON_FILTER_PARAMS = frozenset({'page', 'page_size', 'pagination', 'cursor', 'ordering'})
+
+
+def price_buckets():
+    """Return ``[(min, max), ...]`` price ranges; the last has ``max=None``."""
+    bounds = sorted(getattr(settings, 'PRODUCT_PRICE_FACET_BOUNDS', [500, 1000, 2500, 5000, 10000]))
+    lower = [0] + bounds
+    upper = bounds + [None]
+    return list(zip(lower, upper))
+
+
+def facets_cache_key(request):
+    """Cache key for a facet response: catalog version + filters + audience."""
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in NON_FILTER_PARAMS
+        for value in values
+    )
+    # Staff also see inactive products
+    user = getattr(request, 'user', None)
+    audience = 'staff' if user is not None and user.is_authenticated and user.is_staff else 'public'
+    raw = f'{get_catalog_version(request)}:{audience}:{params!r}'
+    return 'product-facets:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _sorted_counts(counts):
+    return sorted(counts, key=lambda item: (-item['count'], item['name']))
+
+
+def _link_counts(through, field, facet, product_ids):
+    return (
+        through.objects.filter(product_id__in=product_ids, **{f'{field}__is_active': True})
+        .order_by()
+        .annotate(facet=Value(facet, output_field=CharField()))
+        .values('facet', value_id=F(f'{field}_id'), value_name=F(f'{field}__name'))
+        .annotate(count=Count('product_id'))
+    )
+
+
+def compute_facets(queryset):
+    """Return facet counts for the products in ``queryset``."""
+    queryset = queryset.order_by()
+    buckets = price_buckets()
+
+    aggregates = {'total': Count('id')}
+    for index, (low, high) in enumerate(buckets):
+        in_range = Q(price__gte=low)
+        if high is not None:
+            in_range &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('id', filter=in_range)
+
+    rows = queryset.values('brand', 'subcategory_id', 'subcategory__name').annotate(**aggregates)
+
+    total = 0
+    brands = defaultdict(int)
+    subcategories = {}
+    price_counts = [0] * len(buckets)
+    for row in rows:
+        total += row['total']
+        brand = (row['brand'] or '').strip()
+        if brand:
+            brands[brand] += row['total']
+        if row['subcategory_id'] is not None:
+            entry = subcategories.setdefault(
+                row['subcategory_id'],
+                {'id': row['subcategory_id'], 'name': row['subcategory__name'], 'count': 0},
+            )
+            entry['count'] += row['total']
+        for index in range(len(buckets)):
+            price_counts[index] += row[f'price_{index}']
+
+    product_ids = queryset.values('pk')
+    links = _link_counts(Product.colors.through, 'color', 'colors', product_ids).union(
+        _link_counts(Product.sizes.through, 'size', 'sizes', product_ids),
+        all=True,
+    )
+    linked = {'colors': [], 'sizes': []}
+    for row in links:
+        linked[row['facet']].append({'id': row['value_id'], 'name': row['value_name'], 'count': row['count']})
+
+    return {
+        'count': total,
+        'brands': _sorted_counts({'name': name, 'count': count} for name, count in brands.items()),
+        'subcategories': _sorted_counts(subcategories.values()),
+        'colors': _sorted_counts(linked['colors']),
+        'sizes': _sorted_counts(linked['sizes']),
+        'price_ranges': [
+            {'min': low, 'max': high, 'count': count}
+            for (low, high), count in zip(buckets, price_counts)
+        ],
+    }
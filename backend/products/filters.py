@@ -0,0 +1,42 @@
+"""
+Product list filter backends
+"""
+
+from rest_framework import filters
+
+from .search import exact_sku_queryset, fuzzy_products_queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """SearchFilter with an exact-SKU fast path and a fuzzy mode.
+
+    A search that is exactly a product's SKU is answered from the unique SKU
+    index and returns just that product. Otherwise ``?search_mode=fuzzy``
+    matches name/brand/SKU by trigram similarity, ranked best first, and the
+    default mode keeps SearchFilter's icontains matching over the view's
+    ``search_fields``.
+
+    Must run after OrderingFilter so the similarity ranking is not replaced;
+    the requested ordering is kept as its tie-breaker.
+    """
+    search_mode_param = 'search_mode'
+
+    def is_ranked(self, request):
+        """True when the results are ordered by similarity rather than a field."""
+        return (
+            request.query_params.get(self.search_mode_param) == 'fuzzy'
+            and bool(self.get_search_terms(request))
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        search = ' '.join(self.get_search_terms(request))
+        if not search:
+            return queryset
+
+        exact = exact_sku_queryset(queryset, search)
+        if exact.exists():
+            return exact
+
+        if self.is_ranked(request):
+            return fuzzy_products_queryset(queryset, search)
+        return super().filter_queryset(request, queryset, view)
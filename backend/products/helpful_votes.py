@@ -0,0 +1,62 @@
+"""
+Helpful-vote toggle
+Adds or removes a user's helpful vote on an approved review and adjusts
+Review.helpful_count in a single SQL statement (data-modifying CTEs), so a
+toggle is one round-trip and atomic on its own.
+
+Concurrent toggles stay consistent because the counter only moves by the
+rows the statement actually deleted or inserted: a racing insert hits the
+(review, user) unique constraint and does nothing, a racing delete finds
+the row already gone, and the UPDATE re-reads helpful_count after waiting
+for any other writer of the review row.
+"""
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Product, Review, ReviewHelpfulVote
+
+
+def _toggle_sql():
+    return f'''
+        WITH target AS (
+            SELECT id FROM {Review._meta.db_table} WHERE id = %(review)s AND status = 'approved'
+        ),
+        removed AS (
+            DELETE FROM {ReviewHelpfulVote._meta.db_table} AS vote
+            USING target
+            WHERE vote.review_id = target.id AND vote.user_id = %(user)s
+            RETURNING vote.review_id
+        ),
+        added AS (
+            INSERT INTO {ReviewHelpfulVote._meta.db_table} (review_id, user_id, created_at)
+            SELECT id, %(user)s, %(now)s FROM target
+            WHERE NOT EXISTS (SELECT 1 FROM removed)
+            ON CONFLICT (review_id, user_id) DO NOTHING
+            RETURNING review_id
+        ),
+        counted AS (
+            UPDATE {Review._meta.db_table} AS review
+            SET helpful_count = review.helpful_count
+                + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed)
+            FROM target
+            WHERE review.id = target.id
+            RETURNING review.helpful_count, review.product_id
+        )
+        SELECT counted.helpful_count, NOT EXISTS (SELECT 1 FROM removed), product.slug
+        FROM counted
+        JOIN {Product._meta.db_table} AS product ON product.id = counted.product_id
+    '''
+
+
+def toggle_helpful_vote(review_id, user_id):
+    """Flip ``user_id``'s helpful vote on an approved review.
+
+    Returns ``(helpful_count, voted, product_slug)`` after the toggle, or
+    None when the review doesn't exist or isn't approved. ``voted`` is
+    True when the vote exists afterwards, including when a concurrent
+    request inserted it first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_toggle_sql(), {'review': review_id, 'user': user_id, 'now': timezone.now()})
+        return cursor.fetchone()
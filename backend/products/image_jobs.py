@@ -0,0 +1,264 @@
+"""
+Background WebP variant generation
+Uploads only record an ImageVariantJob row; the ``process_image_jobs``
+worker claims pending rows with SELECT ... FOR UPDATE SKIP LOCKED (so
+several workers can share the queue without an external broker) and runs
+generate_webp_variants, spreading the decode/resize work of a batch over
+a bounded process pool. Until a variant exists, nginx serves the original
+image under the variant URL.
+
+Once an image's variants are written, their manifest (widths, dimensions,
+byte sizes) is stored on the ProductImage or ReviewImage row or, for the
+legacy image fields, in Product.image_variants, so serializers can emit srcset data and
+later saves know the variants are current without touching the disk.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .catalog import bump_catalog_version, invalidate_product_detail
+from .image_utils import _variant_path, generate_webp_variants, variant_widths
+from .models import ImageVariantJob, Product, ProductImage, Review, ReviewImage
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Jobs left "processing" this long belonged to a worker that died
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _image_path(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return os.path.join(settings.MEDIA_ROOT, name)
+
+
+LEGACY_IMAGE_FIELDS = ('main_image', 'image_2', 'image_3', 'image_4')
+
+
+def manifest_matches(manifest, name):
+    """True when ``manifest`` was recorded for the file currently stored as ``name``."""
+    return bool(manifest) and manifest.get('src') == name
+
+
+def enqueue_image_variants(name, manifest=None):
+    """Queue variant generation for a stored image unless they are current.
+
+    ``name`` is the storage name of the file (``field.name``) and
+    ``manifest`` the one stored alongside it, if any. A matching manifest
+    skips the queue without a query or touching the disk. Otherwise, when
+    the file was already processed (a shared file, or an instance loaded
+    before the worker finished) its known manifest is copied to every row
+    using it; only files without one are (re)queued. A few queries, so it
+    is safe on the upload path.
+    """
+    if not name or manifest_matches(manifest, name):
+        return None
+    job, created = ImageVariantJob.objects.get_or_create(image=name)
+    if created:
+        return job
+    if job.status == ImageVariantJob.STATUS_DONE:
+        # Content-addressed files are shared: a new row pointing at an
+        # already processed file adopts the manifest stored for it
+        known = find_manifest(name)
+        if known is not None:
+            store_manifest(name, known)
+            return None
+    job.status = ImageVariantJob.STATUS_PENDING
+    job.attempts = 0
+    job.last_error = ''
+    job.started_at = None
+    job.finished_at = None
+    job.save()
+    return job
+
+
+def find_manifest(name):
+    """A manifest already stored for ``name`` on any row, or None."""
+    for model in (ProductImage, ReviewImage):
+        for manifest in model.objects.filter(image=name).values_list('variants', flat=True):
+            if manifest_matches(manifest, name):
+                return manifest
+    references = Q()
+    for field in LEGACY_IMAGE_FIELDS:
+        references |= Q(**{field: name})
+    for image_variants in Product.objects.filter(references).values_list('image_variants', flat=True):
+        for manifest in (image_variants or {}).values():
+            if manifest_matches(manifest, name):
+                return manifest
+    return None
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` pending jobs as processing and return them."""
+    now = timezone.now()
+    ImageVariantJob.objects.filter(
+        status=ImageVariantJob.STATUS_PROCESSING,
+        started_at__lt=now - STALE_AFTER,
+    ).update(status=ImageVariantJob.STATUS_PENDING)
+
+    with transaction.atomic():
+        ids = list(
+            ImageVariantJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageVariantJob.STATUS_PENDING)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        ImageVariantJob.objects.filter(id__in=ids).update(
+            status=ImageVariantJob.STATUS_PROCESSING,
+            attempts=F('attempts') + 1,
+            started_at=now,
+        )
+    return list(ImageVariantJob.objects.filter(id__in=ids).order_by('created_at'))
+
+
+def build_manifest(name, generated):
+    """Storage-level manifest from the result of generate_webp_variants."""
+    return {
+        'src': name,
+        'width': generated['width'],
+        'height': generated['height'],
+        'placeholder': generated.get('placeholder', ''),
+        'variants': [
+            {
+                'name': _variant_path(name, variant['target'], variant['format']),
+                'width': variant['width'],
+                'height': variant['height'],
+                'format': variant['format'],
+                'bytes': variant['bytes'],
+            }
+            for variant in generated['variants']
+        ],
+    }
+
+
+def store_manifest(name, manifest):
+    """Record ``manifest`` on every row that currently references ``name``.
+
+    Rows whose file changed meanwhile don't match the filter and keep
+    their (re-queued) state.
+    """
+    product_ids = set(
+        ProductImage.objects.filter(image=name).values_list('product_id', flat=True)
+    )
+    ProductImage.objects.filter(image=name).update(variants=manifest)
+
+    # Review photos are embedded in the product detail body
+    review_ids = set(ReviewImage.objects.filter(image=name).values_list('review_id', flat=True))
+    if review_ids:
+        ReviewImage.objects.filter(image=name).update(variants=manifest)
+        product_ids.update(Review.objects.filter(pk__in=review_ids).values_list('product_id', flat=True))
+
+    references = Q()
+    for field in LEGACY_IMAGE_FIELDS:
+        references |= Q(**{field: name})
+    with transaction.atomic():
+        for product in Product.objects.filter(references).select_for_update().only('pk', 'image_variants', *LEGACY_IMAGE_FIELDS):
+            image_variants = dict(product.image_variants or {})
+            for field in LEGACY_IMAGE_FIELDS:
+                if getattr(product, field).name == name:
+                    image_variants[field] = manifest
+            Product.objects.filter(pk=product.pk).update(image_variants=image_variants)
+            product_ids.add(product.pk)
+
+    if product_ids:
+        bump_catalog_version()
+        invalidate_product_detail(*Product.objects.filter(pk__in=product_ids).values_list('slug', flat=True))
+
+
+def variant_workers(requested=None):
+    """Pool size: ``requested`` or IMAGE_VARIANT_WORKERS, between 1 and the CPU count."""
+    workers = requested if requested is not None else getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+    return max(1, min(workers, os.cpu_count() or 1))
+
+
+def make_variant_pool(workers=None):
+    """Process pool for variant generation, or None when one worker is enough."""
+    workers = variant_workers(workers)
+    if workers == 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def record_result(job, error=None, generated=None):
+    """Store the outcome of a claimed job.
+
+    ``error`` is the exception raised, if any; otherwise ``generated`` is
+    what generate_webp_variants returned and its manifest is stored.
+    """
+    if error is not None:
+        logger.warning('WebP variants failed for %s (attempt %d): %s', job.image, job.attempts, error)
+        final = isinstance(error, FileNotFoundError) or job.attempts >= MAX_ATTEMPTS
+        job.status = ImageVariantJob.STATUS_FAILED if final else ImageVariantJob.STATUS_PENDING
+        job.last_error = f'{type(error).__name__}: {error}'
+        job.finished_at = timezone.now() if final else None
+    else:
+        if generated:
+            store_manifest(job.image, build_manifest(job.image, generated))
+        job.status = ImageVariantJob.STATUS_DONE
+        job.last_error = ''
+        job.finished_at = timezone.now()
+    # Only write our columns; a re-upload may have re-queued the row meanwhile
+    ImageVariantJob.objects.filter(pk=job.pk, status=ImageVariantJob.STATUS_PROCESSING).update(
+        status=job.status,
+        last_error=job.last_error,
+        finished_at=job.finished_at,
+        updated_at=timezone.now(),
+    )
+    return job.status == ImageVariantJob.STATUS_DONE
+
+
+def run_job(job):
+    """Generate the variants for a claimed job in this process."""
+    try:
+        generated = generate_webp_variants(_image_path(job.image), widths=variant_widths(job.image))
+    except Exception as exc:
+        return record_result(job, exc)
+    return record_result(job, generated=generated)
+
+
+def process_pending(limit=10, pool=None):
+    """Claim and run one batch; returns the number of jobs handled.
+
+    With a ``pool`` (see make_variant_pool) the images of the batch are
+    decoded and resized concurrently in its worker processes; results are
+    recorded here as they complete. Raises BrokenProcessPool, after
+    recording the affected jobs for retry, if a pool process died.
+    """
+    jobs = claim_jobs(limit)
+    if pool is None:
+        for job in jobs:
+            run_job(job)
+        return len(jobs)
+
+    futures = {}
+    broken = None
+    for job in jobs:
+        try:
+            future = pool.submit(
+                generate_webp_variants, _image_path(job.image), widths=variant_widths(job.image),
+            )
+            futures[future] = job
+        except BrokenProcessPool as exc:
+            broken = exc
+            record_result(job, exc)
+    for future in as_completed(futures):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            broken = error
+        record_result(futures[future], error, None if error else future.result())
+    if broken is not None:
+        raise broken
+    return len(jobs)
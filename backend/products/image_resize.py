@@ -0,0 +1,253 @@
+"""
+On-demand image resizing
+Serves WebP renditions of uploaded images at any whitelisted width
+(IMAGE_RESIZE_WIDTHS) for layouts the batch variants don't cover. URLs are
+signed per source image, so clients can pick a width but not make the
+server resize arbitrary files.
+
+Renditions are cached on disk under IMAGE_RESIZE_CACHE_DIR and evicted
+least-recently-used (by mtime, touched on every hit) once the directory
+grows past IMAGE_RESIZE_CACHE_BYTES. Eviction walks the whole directory, so
+misses trigger it at most once per IMAGE_RESIZE_EVICT_INTERVAL across all
+workers. A per-rendition file lock makes concurrent misses, in any worker
+process, wait for a single resize. Eviction deletes the lock files of
+renditions that are gone, but only ones it can lock without waiting; a
+request that then wins the lock on a deleted file notices (its inode no
+longer matches the path) and locks the current file instead, so two
+requests never lock different files for the same rendition.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from PIL import Image
+
+from .image_jobs import _image_path
+from .image_utils import REDUCING_GAP, display_size, draft_oriented, load_oriented, variant_encoding
+
+logger = logging.getLogger(__name__)
+
+RESIZE_PREFIXES = ('products/', 'reviews/')
+# Evict down to this share of the budget so the next pass has headroom
+EVICT_TO = 0.9
+# mtime = end of the last eviction pass
+EVICT_MARKER = '.last-evict'
+
+_signer = signing.Signer(salt='products.image_resize')
+
+
+class InvalidResizeRequest(Exception):
+    """The source, width or signature of a resize request is not acceptable."""
+
+
+def resize_widths():
+    return sorted(getattr(settings, 'IMAGE_RESIZE_WIDTHS', [320, 480, 640, 768, 1024, 1440, 1920]))
+
+
+def sign_source(name):
+    return _signer.signature(name)
+
+
+def resize_url(name, width=None):
+    """Signed URL of the resize endpoint for a stored image (add ``w`` if omitted)."""
+    params = {'src': name, 'sig': sign_source(name)}
+    if width is not None:
+        params['w'] = width
+    return f"{reverse('image-resize')}?{urlencode(params)}"
+
+
+def _check_request(name, width, signature):
+    if not name or not signature or not signing.constant_time_compare(signature, sign_source(name)):
+        raise InvalidResizeRequest('assinatura inválida')
+    normalized = posixpath.normpath(name)
+    if normalized != name or not name.startswith(RESIZE_PREFIXES):
+        raise InvalidResizeRequest('origem inválida')
+    if width not in resize_widths():
+        raise InvalidResizeRequest('largura não permitida')
+
+
+def cache_dir():
+    return str(getattr(settings, 'IMAGE_RESIZE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, '.resized')))
+
+
+def _cache_path(source_path, name, width):
+    # The source mtime is part of the key, so a replaced file never serves a stale rendition
+    params = variant_encoding(width)
+    raw = f'{name}:{width}:{os.path.getmtime(source_path)}:{sorted(params.items())}'
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), digest[:2], f'{digest}.webp')
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _resize(source_path, target, width):
+    with Image.open(source_path) as img:
+        orig_w, orig_h = display_size(img)
+        target_w = min(width, orig_w)
+        target_h = max(1, int(orig_h * target_w / float(orig_w)))
+        draft_oriented(img, target_w)
+        img = load_oriented(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        if img.size != (target_w, target_h):
+            img = img.resize((target_w, target_h), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        # Write-then-rename: readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                img.save(fh, format='WEBP', **variant_encoding(width))
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _lock_path(target):
+    return f'{target}.lock'
+
+
+def _lock_rendition(target):
+    """Open ``target``'s lock file and lock it exclusively; returns the file."""
+    path = _lock_path(target)
+    while True:
+        lock = open(path, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.fstat(lock.fileno()).st_ino == os.stat(path).st_ino:
+                return lock
+        except FileNotFoundError:
+            pass
+        # evict() deleted the file while we waited for it
+        lock.close()
+
+
+def _remove_lock(path):
+    """Delete a rendition's lock file unless someone holds (or waits on) it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.remove(path)
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    finally:
+        os.close(fd)
+
+
+def evict(budget=None):
+    """Delete least recently used renditions until the cache fits its budget.
+
+    The lock files of renditions that are gone are deleted too. Returns the
+    number of bytes freed.
+    """
+    if budget is None:
+        budget = getattr(settings, 'IMAGE_RESIZE_CACHE_BYTES', 512 * 1024 * 1024)
+    entries = []
+    locks = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_dir()):
+        for filename in filenames:
+            if filename.endswith('.webp.lock'):
+                locks.append(os.path.join(dirpath, filename))
+                continue
+            if not filename.endswith('.webp'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    freed = 0
+    if total > budget:
+        entries.sort()
+        for _, size, path in entries:
+            if total - freed <= budget * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            freed += size
+        logger.info('Evicted %d bytes of resized images', freed)
+    for path in locks:
+        if not os.path.exists(path[:-len('.lock')]):
+            _remove_lock(path)
+    return freed
+
+
+def maybe_evict(interval=None):
+    """Run evict() if no worker has done so in the last ``interval`` seconds.
+
+    Returns the number of bytes freed (0 when skipped).
+    """
+    if interval is None:
+        interval = getattr(settings, 'IMAGE_RESIZE_EVICT_INTERVAL', 300)
+    marker = os.path.join(cache_dir(), EVICT_MARKER)
+    try:
+        last = os.path.getmtime(marker)
+    except FileNotFoundError:
+        last = None
+    if last is not None and time.time() - last < interval:
+        return 0
+    with open(marker, 'a') as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another worker is evicting right now
+            return 0
+        try:
+            if last is not None and os.fstat(fh.fileno()).st_mtime != last:
+                # ...or finished a pass since we looked
+                return 0
+            freed = evict()
+            os.utime(marker)
+            return freed
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def get_resized(name, width, signature):
+    """Return the path of the cached rendition of ``name`` at ``width``.
+
+    Raises InvalidResizeRequest for bad input and FileNotFoundError when the
+    source image doesn't exist.
+    """
+    _check_request(name, width, signature)
+    source_path = _image_path(name)
+    if not os.path.isfile(source_path):
+        raise FileNotFoundError(name)
+    target = _cache_path(source_path, name, width)
+    if os.path.exists(target):
+        _touch(target)
+        return target
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with _lock_rendition(target) as lock:
+        try:
+            # Another request may have produced it while we waited for the lock
+            if os.path.exists(target):
+                _touch(target)
+                return target
+            _resize(source_path, target, width)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    maybe_evict()
+    return target
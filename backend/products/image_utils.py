@@ -1,58 +1,195 @@
+import base64
 import os
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
+from django.conf import settings
 
 
 TARGET_WIDTHS = [320, 640, 1024]
 
+# Review photos get thumbnails plus a capped full-view rendition; the
+# originals keep their EXIF (GPS included), so ReviewSerializer only hands
+# out these metadata-free renditions (or a resize URL until they exist)
+REVIEW_TARGET_WIDTHS = [160, 480, 1280]
+
+# Low-quality image placeholder: a tiny WebP inlined as a data URI that
+# clients stretch (blurred) over the image box until the real image loads
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 30
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# WebP encoder settings per width. Encoder effort (method) costs time in
+# proportion to pixel count, so it is spent where images are small.
+DEFAULT_VARIANT_ENCODING = {
+    1024: {"quality": 80, "method": 4},
+    640: {"quality": 80, "method": 5},
+    320: {"quality": 80, "method": 6},
+    160: {"quality": 75, "method": 6},
+}
+
+# Resize first shrinks by whole factors with reduce() down to this multiple
+# of the target size, then finishes with LANCZOS
+REDUCING_GAP = 3.0
+
 
 def _variant_path(original_path: str, width: int, ext: str = "webp") -> str:
     base, _ = os.path.splitext(original_path)
     return f"{base}-{width}.{ext}"
 
 
-def generate_webp_variants(image_path: str) -> None:
+def variant_widths(name: str) -> list:
+    """Variant widths for a stored image: review photos get their own set."""
+    if name.replace("\\", "/").startswith("reviews/"):
+        return list(REVIEW_TARGET_WIDTHS)
+    return list(TARGET_WIDTHS)
+
+
+def _stale_widths(image_path: str, widths=None) -> list:
+    src_mtime = os.path.getmtime(image_path)
+    stale = []
+    for w in widths or TARGET_WIDTHS:
+        try:
+            if os.path.getmtime(_variant_path(image_path, w, "webp")) >= src_mtime:
+                continue
+        except OSError:
+            pass
+        stale.append(w)
+    return stale
+
+
+def variant_encoding(width: int) -> dict:
+    """WebP encoder params for a width (IMAGE_VARIANT_ENCODING overrides).
+
+    Widths without defaults of their own (on-demand resizes) use those of
+    the closest smaller width.
+    """
+    known = [w for w in sorted(DEFAULT_VARIANT_ENCODING) if w <= width] or [min(DEFAULT_VARIANT_ENCODING)]
+    params = dict(DEFAULT_VARIANT_ENCODING[known[-1]])
+    overrides = getattr(settings, "IMAGE_VARIANT_ENCODING", None) or {}
+    params.update(overrides.get(width, {}))
+    return params
+
+
+def _orientation(img) -> int:
+    return img.getexif().get(0x0112, 1)
+
+
+def display_size(img) -> tuple:
+    """(width, height) of an opened image once its EXIF orientation is applied."""
+    if _orientation(img) in _TRANSPOSED_ORIENTATIONS:
+        return img.height, img.width
+    return img.size
+
+
+def draft_oriented(img, width: int) -> None:
+    """Let a JPEG decode scaled down to just above ``width`` (in display orientation)."""
+    if img.format != "JPEG":
+        return
+    transposed = _orientation(img) in _TRANSPOSED_ORIENTATIONS
+    disp_w, disp_h = display_size(img)
+    draft_w = min(width, disp_w)
+    draft_h = max(1, round(disp_h * draft_w / disp_w))
+    img.draft(img.mode, (draft_h, draft_w) if transposed else (draft_w, draft_h))
+
+
+def load_oriented(img):
+    """Decode an opened image and apply its EXIF orientation."""
+    img.load()
+    if _orientation(img) != 1:
+        img = ImageOps.exif_transpose(img)
+    return img
+
+
+def placeholder_data_uri(variant_path: str) -> str:
+    """``data:`` URI of a PLACEHOLDER_WIDTH-wide WebP made from a (small) variant."""
+    with Image.open(variant_path) as img:
+        img.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=PLACEHOLDER_QUALITY)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def describe_variants(image_path: str, size: tuple, widths=None) -> dict:
+    """Manifest of the variants on disk for an original of ``size`` (w, h).
+
+    Reads only the WebP headers, plus the smallest variant to derive the
+    ``placeholder`` (see placeholder_data_uri). Each entry carries the
+    requested width (``target``, which names the file) and the actual
+    encoded dimensions.
+    """
+    variants = []
+    for w in widths or TARGET_WIDTHS:
+        path = _variant_path(image_path, w, "webp")
+        with Image.open(path) as variant:
+            width, height = variant.size
+        variants.append({
+            "target": w,
+            "width": width,
+            "height": height,
+            "format": "webp",
+            "bytes": os.path.getsize(path),
+        })
+    smallest = _variant_path(image_path, min(widths or TARGET_WIDTHS), "webp")
+    return {
+        "width": size[0],
+        "height": size[1],
+        "placeholder": placeholder_data_uri(smallest),
+        "variants": variants,
+    }
+
+
+def generate_webp_variants(image_path: str, force: bool = False, widths=None) -> dict:
     """Generate WebP variants at multiple widths for a given image path.
 
     Creates files alongside the original with the pattern: name-<width>.webp
-    Skips generation if the variant exists and is newer than the source.
+    for each of ``widths`` (default TARGET_WIDTHS; see variant_widths).
+    Skips generation if the variant exists and is newer than the source,
+    unless ``force`` (e.g. after changing IMAGE_VARIANT_ENCODING).
+    Raises on missing or unreadable images so the job queue can record them.
+    Returns the variant manifest (see describe_variants).
+
+    The source is decoded once. JPEGs are decoded in draft mode, letting
+    libjpeg scale by 1/2, 1/4 or 1/8 in the DCT domain to just above the
+    largest width needed; each smaller width is then resized from the
+    previous one (1024 -> 640 -> 320) instead of from the full original.
+    The EXIF orientation is applied and no metadata (EXIF, GPS, ICC) is
+    carried over into the variants.
     """
-    try:
-        if not image_path or not os.path.exists(image_path):
-            return
+    if not image_path or not os.path.exists(image_path):
+        raise FileNotFoundError(image_path)
 
+    widths = list(widths or TARGET_WIDTHS)
+    stale = list(widths) if force else _stale_widths(image_path, widths)
+    if not stale:
         with Image.open(image_path) as img:
-            # Convert to RGB to avoid issues with PNG/CMYK, etc.
-            if img.mode not in ("RGB", "RGBA"):
-                img = img.convert("RGB")
-
-            orig_w, orig_h = img.size
-            if orig_w == 0 or orig_h == 0:
-                return
-
-            for w in TARGET_WIDTHS:
-                # Keep the filename as requested width to match frontend URLs,
-                # but never upscale the actual image content beyond original width
-                target_w = min(w, orig_w)
-                variant = _variant_path(image_path, w, "webp")
-                try:
-                    src_mtime = os.path.getmtime(image_path)
-                    if os.path.exists(variant) and os.path.getmtime(variant) >= src_mtime:
-                        continue
-                except Exception:
-                    pass
-
-                # Create resized copy preserving aspect ratio
-                ratio = target_w / float(orig_w)
-                h = int(orig_h * ratio)
-                resized = img.resize((target_w, h), Image.LANCZOS)
-
-                # Save as WebP with reasonable quality
-                params = {"format": "WEBP", "quality": 80, "method": 6}
-                # Preserve transparency where applicable
-                if resized.mode == "RGBA":
-                    params["lossless"] = False
-                resized.save(variant, **params)
-    except Exception:
-        # Fail-safe: never break the request path due to optimization issues
-        return
+            return describe_variants(image_path, display_size(img), widths)
+
+    with Image.open(image_path) as img:
+        orig_w, orig_h = display_size(img)
+        if orig_w == 0 or orig_h == 0:
+            raise ValueError(f"Empty image: {image_path}")
+
+        largest = max(stale)
+        draft_oriented(img, largest)
+        img = load_oriented(img)
+
+        # Convert to RGB to avoid issues with PNG/CMYK, etc.
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        current = img
+        for w in sorted(widths, reverse=True):
+            if w > largest:
+                continue
+            # Keep the filename as requested width to match frontend URLs,
+            # but never upscale the actual image content beyond original width
+            target_w = min(w, orig_w)
+            target_h = max(1, int(orig_h * target_w / float(orig_w)))
+            if current.size != (target_w, target_h):
+                current = current.resize((target_w, target_h), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+            if w in stale:
+                current.save(_variant_path(image_path, w, "webp"), format="WEBP", **variant_encoding(w))
+
+    return describe_variants(image_path, (orig_w, orig_h), widths)
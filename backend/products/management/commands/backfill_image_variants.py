@@ -0,0 +1,283 @@
+"""
+Management command to backfill WebP variants for the whole media library
+
+Walks the product and review uploads in a stable (sorted) order and
+regenerates missing or stale variants on a process pool. Progress is
+checkpointed after every batch, so an interrupted run picks up where it
+stopped; files already handled are skipped on resume.
+"""
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from PIL import Image
+
+from products.image_jobs import build_manifest, make_variant_pool, store_manifest, variant_workers
+from products.image_utils import (
+    REVIEW_TARGET_WIDTHS, TARGET_WIDTHS, _stale_widths, _variant_path, generate_webp_variants, variant_widths,
+)
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIXES = ('products', 'reviews')
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+VARIANT_RE = re.compile(r'-(%s)\.webp$' % '|'.join(str(w) for w in sorted(set(TARGET_WIDTHS) | set(REVIEW_TARGET_WIDTHS))))
+
+# Dry-run fallback when the library has no variants to calibrate from
+# (typical for quality 80 WebP photos)
+DEFAULT_WEBP_BYTES_PER_PIXEL = 0.12
+
+PROGRESS_EVERY = 10  # seconds
+
+
+def library_files(media_root):
+    """Storage names of every original image under MEDIA_PREFIXES, sorted."""
+    names = []
+    for prefix in MEDIA_PREFIXES:
+        top = os.path.join(media_root, prefix)
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                if not filename.lower().endswith(PHOTO_EXTENSIONS) or VARIANT_RE.search(filename):
+                    continue
+                path = os.path.join(dirpath, filename)
+                names.append(os.path.relpath(path, media_root).replace(os.sep, '/'))
+    names.sort()
+    return names
+
+
+def _stale(name, path, force):
+    widths = variant_widths(name)
+    if force:
+        return widths
+    try:
+        return _stale_widths(path, widths)
+    except OSError:
+        return widths
+
+
+class Checkpoint:
+    """Progress of a backfill run, saved as JSON after every batch."""
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self.data = data or {
+            'last': '',
+            'done': 0,
+            'regenerated': 0,
+            'failed': [],
+        }
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as fh:
+                return cls(path, json.load(fh))
+        except FileNotFoundError:
+            return cls(path)
+        except ValueError as exc:
+            raise CommandError(f'Checkpoint inválido em {path}: {exc}')
+
+    def save(self):
+        # Write-then-rename so a kill mid-write never leaves a torn file
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.data, fh)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerates missing or stale WebP variants for every product and review image, '
+        'in parallel and resumably'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Image processes (default: IMAGE_VARIANT_WORKERS)')
+        parser.add_argument('--batch', type=int, help='Images per checkpoint (default: 8 per worker)')
+        parser.add_argument('--force', action='store_true', help='Re-encode every variant, even current ones')
+        parser.add_argument('--dry-run', action='store_true', help='Only estimate the work and disk space needed')
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.image-variant-backfill.json'),
+            help='Progress file used to resume an interrupted run',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(media_root):
+            raise CommandError(f'Pasta de mídia não encontrada: {media_root}')
+        names = library_files(media_root)
+
+        if options['dry_run']:
+            self._estimate(media_root, names, options['force'])
+            return
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        if not options['restart']:
+            checkpoint = Checkpoint.load(options['checkpoint'])
+        pending = [name for name in names if name > checkpoint.data['last']]
+        if checkpoint.data['last']:
+            self.stdout.write(f'Retomando após {checkpoint.data["last"]} ({checkpoint.data["done"]} já processadas)')
+        self.stdout.write(f'{len(pending)} imagens a verificar')
+
+        workers = variant_workers(options['workers'])
+        batch = options['batch'] or workers * 8
+        pool = self._new_pool(workers)
+        started = time.monotonic()
+        run_done = 0
+        run_megapixels = 0.0
+        last_report = started
+        try:
+            for start in range(0, len(pending), batch):
+                chunk = pending[start:start + batch]
+                close_old_connections()
+                done, regenerated, megapixels, failed, pool = self._run_batch(
+                    media_root, chunk, options['force'], pool, workers,
+                )
+                elapsed = time.monotonic() - started
+                run_done += done
+                run_megapixels += megapixels
+                data = checkpoint.data
+                data['last'] = chunk[-1]
+                data['done'] += done
+                data['regenerated'] += regenerated
+                data['failed'].extend(failed)
+                checkpoint.save()
+                if time.monotonic() - last_report >= PROGRESS_EVERY or start + batch >= len(pending):
+                    last_report = time.monotonic()
+                    self._report(start + len(chunk), len(pending), run_done, run_megapixels, elapsed)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f'Interrompido; execute novamente para retomar após {checkpoint.data["last"] or "o início"}'
+            ))
+            return
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        data = checkpoint.data
+        for name, error in data['failed']:
+            self.stderr.write(f'Falhou: {name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {data["done"]} imagens verificadas, {data["regenerated"]} com variantes regeneradas, '
+            f'{len(data["failed"])} falhas'
+        ))
+        # A finished run starts from scratch next time
+        checkpoint.remove()
+
+    def _new_pool(self, workers):
+        if workers > 1:
+            # Forked children must not inherit an open database connection
+            connections.close_all()
+        return make_variant_pool(workers)
+
+    def _run_batch(self, media_root, chunk, force, pool, workers):
+        """Process one batch; returns (done, regenerated, megapixels, failed, pool)."""
+        done = regenerated = 0
+        megapixels = 0.0
+        failed = []
+        stale = {name: _stale(name, os.path.join(media_root, name), force) for name in chunk}
+
+        results = {}
+        if pool is None:
+            for name in chunk:
+                try:
+                    results[name] = generate_webp_variants(
+                        os.path.join(media_root, name), force, variant_widths(name),
+                    )
+                except Exception as exc:
+                    results[name] = exc
+        else:
+            futures = {
+                pool.submit(generate_webp_variants, os.path.join(media_root, name), force, variant_widths(name)): name
+                for name in chunk
+            }
+            broken = False
+            for future in as_completed(futures):
+                error = future.exception()
+                broken = broken or isinstance(error, BrokenProcessPool)
+                results[futures[future]] = error if error else future.result()
+            if broken:
+                # A child died (e.g. OOM on a huge image); carry on with a new pool
+                logger.error('Image worker pool broke during backfill; restarting it')
+                pool.shutdown(wait=False)
+                pool = self._new_pool(workers)
+
+        for name in chunk:
+            result = results[name]
+            done += 1
+            if isinstance(result, Exception):
+                logger.warning('WebP variants failed for %s: %s', name, result)
+                failed.append((name, f'{type(result).__name__}: {result}'))
+                continue
+            if stale[name]:
+                regenerated += 1
+                megapixels += result['width'] * result['height'] / 1e6
+            store_manifest(name, build_manifest(name, result))
+        return done, regenerated, megapixels, failed, pool
+
+    def _report(self, position, total, done, megapixels, elapsed):
+        elapsed = max(elapsed, 1e-6)
+        self.stdout.write(
+            f'{position}/{total}  {done / elapsed:6.2f} imagens/s  {megapixels / elapsed:7.1f} MP/s'
+        )
+
+    def _estimate(self, media_root, names, force):
+        """Dry run: count the stale originals and estimate the bytes to write."""
+        variant_bytes = variant_pixels = 0
+        stale_images = stale_variants = source_bytes = target_pixels = unreadable = 0
+        for name in names:
+            path = os.path.join(media_root, name)
+            stale = _stale(name, path, force)
+            for w in variant_widths(name):
+                if w in stale:
+                    continue
+                # Calibrate the bytes-per-pixel estimate on existing variants
+                variant = _variant_path(path, w, 'webp')
+                try:
+                    with Image.open(variant) as img:
+                        variant_pixels += img.width * img.height
+                    variant_bytes += os.path.getsize(variant)
+                except OSError:
+                    pass
+            if not stale:
+                continue
+            try:
+                with Image.open(path) as img:
+                    width, height = img.size
+            except OSError:
+                unreadable += 1
+                continue
+            stale_images += 1
+            stale_variants += len(stale)
+            source_bytes += os.path.getsize(path)
+            for w in stale:
+                target_w = min(w, width)
+                target_pixels += target_w * max(1, int(height * target_w / width))
+
+        ratio = variant_bytes / variant_pixels if variant_pixels else DEFAULT_WEBP_BYTES_PER_PIXEL
+        estimate = target_pixels * ratio
+        self.stdout.write(f'Imagens na biblioteca: {len(names)}')
+        self.stdout.write(
+            f'A regenerar: {stale_images} imagens ({source_bytes / 1024 ** 2:.1f} MiB), {stale_variants} variantes'
+        )
+        if unreadable:
+            self.stdout.write(f'Ilegíveis: {unreadable}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Estimativa: {estimate / 1024 ** 2:.1f} MiB de variantes WebP '
+            f'({ratio:.3f} bytes/pixel{"" if variant_pixels else ", valor padrão"})'
+        ))
@@ -0,0 +1,141 @@
+"""
+Management command to benchmark WebP variant generation
+
+Compares the current pipeline (single decode, JPEG draft mode, 1024->640->320
+cascade) with the previous one (full decode, every width resized from the
+original with LANCZOS, method=6) on a folder of photos. Each implementation
+runs in its own process so peak RSS is measured independently.
+"""
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from products.image_utils import TARGET_WIDTHS, _variant_path, generate_webp_variants
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def legacy_generate_webp_variants(image_path):
+    """The pre-pipeline implementation, kept here as the baseline."""
+    with Image.open(image_path) as img:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        orig_w, orig_h = img.size
+        for w in TARGET_WIDTHS:
+            target_w = min(w, orig_w)
+            h = int(orig_h * (target_w / float(orig_w)))
+            resized = img.resize((target_w, h), Image.LANCZOS)
+            resized.save(_variant_path(image_path, w, "webp"), format="WEBP", quality=80, method=6)
+
+
+IMPLEMENTATIONS = {
+    'legacy': legacy_generate_webp_variants,
+    'pipeline': generate_webp_variants,
+}
+
+
+def _run(name, paths, repeat, results):
+    func = IMPLEMENTATIONS[name]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            for w in TARGET_WIDTHS:
+                try:
+                    os.remove(_variant_path(path, w, "webp"))
+                except FileNotFoundError:
+                    pass
+            func(path)
+    elapsed = time.perf_counter() - start
+    results.put((name, elapsed, _peak_rss_kib()))
+
+
+def _peak_rss_kib():
+    # VmHWM starts afresh at exec; ru_maxrss would carry the parent's peak over
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _synthetic_photo(path, size, seed):
+    """A noisy gradient, which compresses roughly like a phone photo."""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 64 + seed % 32)
+    Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180))).save(
+        path, format='JPEG', quality=90,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the WebP variant pipeline against the previous implementation (throughput and peak RSS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='?', help='Folder of photos (default: generate synthetic 12MP JPEGs)')
+        parser.add_argument('--synthetic', type=int, default=8, help='Synthetic photos when no corpus is given')
+        parser.add_argument('--repeat', type=int, default=1, help='Passes over the corpus per implementation')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='variant-bench-')
+        try:
+            paths = self._prepare_corpus(options, workdir)
+            if not paths:
+                raise CommandError('Nenhuma foto encontrada no corpus')
+            megapixels = sum(self._megapixels(path) for path in paths)
+            self.stdout.write(f'Corpus: {len(paths)} fotos, {megapixels:.1f} MP, repetições: {options["repeat"]}')
+
+            context = multiprocessing.get_context('spawn')
+            results = context.Queue()
+            for name in IMPLEMENTATIONS:
+                process = context.Process(target=_run, args=(name, paths, options['repeat'], results))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    raise CommandError(f'Falha ao executar a implementação {name}')
+
+            rows = dict((name, (elapsed, rss)) for name, elapsed, rss in (results.get() for _ in IMPLEMENTATIONS))
+            images = len(paths) * options['repeat']
+            for name, (elapsed, rss) in rows.items():
+                self.stdout.write(
+                    f'{name:>9}: {elapsed:7.2f}s  {images / elapsed:6.2f} fotos/s  '
+                    f'{megapixels * options["repeat"] / elapsed:7.1f} MP/s  pico RSS {rss / 1024:7.1f} MiB'
+                )
+            legacy, pipeline = rows['legacy'], rows['pipeline']
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Pipeline {legacy[0] / pipeline[0]:.1f}x mais rápido, '
+                f'pico RSS {pipeline[1] / legacy[1] * 100:.0f}% do anterior'
+            ))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _prepare_corpus(self, options, workdir):
+        if options['corpus']:
+            if not os.path.isdir(options['corpus']):
+                raise CommandError(f'Pasta não encontrada: {options["corpus"]}')
+            paths = []
+            for name in sorted(os.listdir(options['corpus'])):
+                if name.lower().endswith(PHOTO_EXTENSIONS):
+                    # Work on copies so variants never land next to the originals
+                    target = os.path.join(workdir, name)
+                    shutil.copy2(os.path.join(options['corpus'], name), target)
+                    paths.append(target)
+            return paths
+        paths = []
+        for index in range(options['synthetic']):
+            path = os.path.join(workdir, f'photo-{index}.jpg')
+            _synthetic_photo(path, (4032, 3024), index)
+            paths.append(path)
+        return paths
+
+    def _megapixels(self, path):
+        with Image.open(path) as img:
+            return img.width * img.height / 1e6
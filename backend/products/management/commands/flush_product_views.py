@@ -0,0 +1,51 @@
+"""
+Management command that drains queued product views into view_count
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from products.view_counter import flush_views
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Adds queued product page views to Product.view_count '
+        '(run continuously every PRODUCT_VIEW_FLUSH_INTERVAL seconds, or with --once)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--batch', type=int, help='Views per UPDATE (default: PRODUCT_VIEW_FLUSH_BATCH)')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Seconds between flushes (default: PRODUCT_VIEW_FLUSH_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is None:
+            interval = getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 60)
+        total = 0
+        while True:
+            try:
+                # Drain everything queued so far, one batch at a time
+                while True:
+                    drained = flush_views(options['batch'])
+                    total += drained
+                    if not drained:
+                        break
+            except Exception:
+                if options['once']:
+                    raise
+                logger.exception('Failed to flush product views; retrying in %ss', interval)
+            if options['once']:
+                break
+            time.sleep(interval)
+            # Drop connections that died or expired while idle
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} visualizações de produtos contabilizadas'))
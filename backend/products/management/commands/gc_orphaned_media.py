@@ -0,0 +1,257 @@
+"""
+Management command to delete orphaned product and review media
+
+Lists every file under the product and review upload folders (one thread
+per subfolder) and compares the listing against the set of names the
+database still references, loaded with one query per image field. Files
+no row points at are orphans: originals of deleted images, abandoned
+``products/tmp/<bucket>/`` uploads, and the WebP variants of either.
+
+Orphans modified within the grace period are kept, so an upload whose
+row isn't saved yet (or a content-addressed file that was just saved
+again) is never deleted under a running request. The listing can be
+minutes old by the time it is acted on, so each original is checked again
+right before it is removed: its ImageBlob row is locked and must still be
+unreferenced (ref_count) and old, no row may point at it and its mtime
+must still be past the cutoff. Variants of an original spared this way
+are kept too.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from products.image_jobs import LEGACY_IMAGE_FIELDS
+from products.models import ImageBlob, ImageVariantJob, Product, ProductImage, ReviewImage
+
+from .backfill_image_variants import MEDIA_PREFIXES, VARIANT_RE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRACE_HOURS = 24
+DELETE_BATCH = 1000
+
+
+def referenced_names(among=None):
+    """Every storage name referenced by a product, gallery or review image.
+
+    ``among`` limits the lookup to those names.
+    """
+    gallery = ProductImage.objects.all()
+    reviews = ReviewImage.objects.all()
+    products = Product.objects.all()
+    if among is not None:
+        gallery = gallery.filter(image__in=among)
+        reviews = reviews.filter(image__in=among)
+        condition = Q()
+        for field in LEGACY_IMAGE_FIELDS:
+            condition |= Q(**{f'{field}__in': among})
+        products = products.filter(condition)
+    names = set(gallery.values_list('image', flat=True).iterator())
+    names.update(reviews.values_list('image', flat=True).iterator())
+    for row in products.values_list(*LEGACY_IMAGE_FIELDS).iterator():
+        names.update(row)
+    names.discard('')
+    names.discard(None)
+    return names
+
+
+def _scan_dir(media_root, top):
+    entries = []
+    for dirpath, _, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            name = os.path.relpath(path, media_root).replace(os.sep, '/')
+            entries.append((name, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def scan_media(media_root, workers):
+    """(name, size, mtime) of every file under MEDIA_PREFIXES."""
+    tops = []
+    entries = []
+    for prefix in MEDIA_PREFIXES:
+        root = os.path.join(media_root, prefix)
+        try:
+            children = list(os.scandir(root))
+        except FileNotFoundError:
+            continue
+        for child in children:
+            if child.is_dir(follow_symlinks=False):
+                tops.append(child.path)
+            elif child.is_file(follow_symlinks=False):
+                stat = child.stat()
+                entries.append((f'{prefix}/{child.name}', stat.st_size, stat.st_mtime))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(lambda top: _scan_dir(media_root, top), tops):
+            entries.extend(found)
+    return entries
+
+
+def _stem(name):
+    """Original name without extension; variants of ``a/b.jpg`` are ``a/b-<w>.webp``."""
+    match = VARIANT_RE.search(name)
+    return name[:match.start()] if match else os.path.splitext(name)[0]
+
+
+def find_orphans(entries, referenced, recent, cutoff):
+    """Split orphaned entries into (deletable, within_grace).
+
+    A variant belongs to every original sharing its stem, so it is kept as
+    long as any of them is referenced or still within the grace period.
+    """
+    kept_stems = {os.path.splitext(name)[0] for name in referenced}
+    orphans = []
+    young = []
+    for entry in entries:
+        name, _, mtime = entry
+        if name in referenced or VARIANT_RE.search(name):
+            continue
+        if mtime >= cutoff or name in recent:
+            young.append(entry)
+            kept_stems.add(os.path.splitext(name)[0])
+        else:
+            orphans.append(entry)
+    for entry in entries:
+        name, _, mtime = entry
+        if name in referenced or not VARIANT_RE.search(name) or _stem(name) in kept_stems:
+            continue
+        (young if mtime >= cutoff else orphans).append(entry)
+    return orphans, young
+
+
+def _modified_since(path, cutoff):
+    try:
+        return os.stat(path).st_mtime >= cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _remove(path, cutoff):
+    if _modified_since(path, cutoff):
+        return False
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def remove_originals(media_root, names, cutoff_at):
+    """Delete the original files in ``names`` that are still orphaned.
+
+    Runs in one transaction holding the names' ImageBlob rows locked, so a
+    concurrent save of the same bytes (which upserts its blob before
+    touching the file) waits for the deletion and then writes the file
+    again. Returns ``(removed, spared)`` lists of names.
+    """
+    cutoff = cutoff_at.timestamp()
+    removed = []
+    spared = []
+    with transaction.atomic():
+        blobs = {
+            blob.name: blob
+            for blob in ImageBlob.objects.select_for_update().filter(name__in=names).only('name', 'ref_count', 'updated_at')
+        }
+        referenced = referenced_names(names)
+        for name in names:
+            blob = blobs.get(name)
+            if name in referenced or (blob and (blob.ref_count > 0 or blob.updated_at >= cutoff_at)):
+                spared.append(name)
+            elif _remove(os.path.join(media_root, name), cutoff):
+                removed.append(name)
+            elif _modified_since(os.path.join(media_root, name), cutoff):
+                spared.append(name)
+        gone = [name for name in names if name not in spared]
+        ImageBlob.objects.filter(name__in=gone, ref_count__lte=0).delete()
+        ImageVariantJob.objects.filter(image__in=gone).delete()
+    return removed, spared
+
+
+def _prune_empty_dirs(media_root, names):
+    """Remove folders emptied by the deletion, up to (not including) the prefix."""
+    dirs = {os.path.dirname(os.path.join(media_root, name)) for name in names}
+    tops = {os.path.join(media_root, prefix) for prefix in MEDIA_PREFIXES}
+    for path in sorted(dirs, key=len, reverse=True):
+        while path not in tops and path.startswith(media_root):
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+            path = os.path.dirname(path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes product and review media files (originals and WebP variants) that no database row '
+        'references and that are older than a grace period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=DEFAULT_GRACE_HOURS,
+            help=f'Keep orphans modified more recently than this (default: {DEFAULT_GRACE_HOURS})',
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Threads used to scan and delete')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(media_root):
+            raise CommandError(f'Pasta de mídia não encontrada: {media_root}')
+        if options['grace_hours'] < 0:
+            raise CommandError('--grace-hours não pode ser negativo')
+        workers = max(1, options['workers'])
+
+        started = time.monotonic()
+        # List the files before loading references: a file uploaded in
+        # between is either referenced or younger than the cutoff
+        entries = scan_media(media_root, workers)
+        cutoff_at = timezone.now() - timedelta(hours=options['grace_hours'])
+        referenced = referenced_names()
+        recent = set(ImageBlob.objects.filter(updated_at__gte=cutoff_at).values_list('name', flat=True))
+        orphans, young = find_orphans(entries, referenced, recent, cutoff_at.timestamp())
+
+        total_bytes = sum(size for _, size, _ in entries)
+        orphan_bytes = sum(size for _, size, _ in orphans)
+        self.stdout.write(
+            f'{len(entries)} arquivos ({total_bytes / 1024 ** 2:.1f} MiB) verificados em '
+            f'{time.monotonic() - started:.1f}s; {len(referenced)} referenciados no banco'
+        )
+        self.stdout.write(
+            f'Órfãos: {len(orphans)} ({orphan_bytes / 1024 ** 2:.1f} MiB recuperáveis), '
+            f'{len(young)} no período de carência'
+        )
+        if options['dry_run'] or not orphans:
+            return
+
+        sizes = {name: size for name, size, _ in orphans}
+        originals = [name for name in sizes if not VARIANT_RE.search(name)]
+        removed = []
+        spared_stems = set()
+        for start in range(0, len(originals), DELETE_BATCH):
+            done, spared = remove_originals(media_root, originals[start:start + DELETE_BATCH], cutoff_at)
+            removed.extend(done)
+            spared_stems.update(os.path.splitext(name)[0] for name in spared)
+        variants = [name for name in sizes if VARIANT_RE.search(name) and _stem(name) not in spared_stems]
+        cutoff = cutoff_at.timestamp()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda name: _remove(os.path.join(media_root, name), cutoff), variants)
+            removed.extend(name for name, done in zip(variants, results) if done)
+        _prune_empty_dirs(media_root, removed)
+        freed = sum(sizes[name] for name in removed)
+        logger.info('Deleted %d orphaned media files (%d bytes)', len(removed), freed)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(removed)} arquivos órfãos removidos, {freed / 1024 ** 2:.1f} MiB liberados'
+        ))
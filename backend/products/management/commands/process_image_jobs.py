@@ -0,0 +1,55 @@
+"""
+Management command that runs the background WebP variant queue
+"""
+import logging
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from products.image_jobs import make_variant_pool, process_pending, variant_workers
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Processes queued WebP variant jobs (run continuously as a worker, or with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--workers', type=int, help='Image processes (default: IMAGE_VARIANT_WORKERS)')
+        parser.add_argument('--batch', type=int, help='Jobs claimed per batch (default: 2 per worker)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def _new_pool(self, workers):
+        # Forked children must not inherit an open database connection
+        connections.close_all()
+        return make_variant_pool(workers)
+
+    def handle(self, *args, **options):
+        workers = variant_workers(options['workers'])
+        batch = options['batch'] or workers * 2
+        pool = self._new_pool(workers)
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    handled = process_pending(batch, pool)
+                except BrokenProcessPool:
+                    # A child died (e.g. OOM on a huge image); its jobs were
+                    # sent back to the queue
+                    logger.exception('Image worker pool broke; restarting it')
+                    pool.shutdown(wait=False)
+                    pool = self._new_pool(workers)
+                    continue
+                total += handled
+                if handled:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} tarefas de variantes de imagem processadas'))
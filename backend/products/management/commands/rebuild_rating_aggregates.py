@@ -0,0 +1,25 @@
+"""
+Management command to rebuild product rating aggregates from approved reviews
+"""
+from django.core.management.base import BaseCommand
+from products.ratings import rebuild_rating_aggregates
+from products.catalog import bump_catalog_version, invalidate_all_product_details
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Product.rating_sum / rating_count from approved reviews in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='products',
+            help='Only rebuild the given product id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_aggregates(options['products'])
+        bump_catalog_version()
+        invalidate_all_product_details()
+        self.stdout.write(self.style.SUCCESS(f'✓ Agregados de avaliação reconstruídos para {updated} produtos'))
@@ -0,0 +1,13 @@
+"""
+Management command to rebuild the product full-text search documents
+"""
+from django.core.management.base import BaseCommand
+from products.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Product.search_vector for every product in a single UPDATE'
+
+    def handle(self, *args, **options):
+        updated = update_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f'✓ Índice de pesquisa reconstruído para {updated} produtos'))
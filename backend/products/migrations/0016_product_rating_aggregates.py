@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:38
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+
+    def approved(aggregate):
+        return Coalesce(
+            Subquery(
+                Review.objects.filter(product=OuterRef('pk'), status='approved')
+                .order_by()
+                .values('product')
+                .annotate(value=aggregate)
+                .values('value')[:1],
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    Product.objects.update(rating_sum=approved(Sum('rating')), rating_count=approved(Count('id')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Total de Avaliações'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Soma das Avaliações'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
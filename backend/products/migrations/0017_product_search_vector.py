@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Category = apps.get_model('products', 'Category')
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    Product.objects.update(search_vector=(
+        SearchVector('name', 'brand', weight='A', config='portuguese_unaccent') +
+        SearchVector(category_name, weight='B', config='portuguese_unaccent') +
+        SearchVector('short_description', weight='C', config='portuguese_unaccent') +
+        SearchVector('description', weight='D', config='portuguese_unaccent')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_product_rating_aggregates'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunSQL(
+            sql=(
+                'CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);'
+                'ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent '
+                'ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;'
+            ),
+            reverse_sql='DROP TEXT SEARCH CONFIGURATION portuguese_unaccent;',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_review_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'status', 'created_at', 'id'], name='products_re_product_49dccb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'status', 'rating', 'id'], name='products_re_product_c243f3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'status', 'helpful_count', 'id'], name='products_re_product_dacdb8_idx'),
+        ),
+    ]
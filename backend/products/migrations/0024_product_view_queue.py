@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_review_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductView',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('slug', models.CharField(max_length=200, verbose_name='Slug do produto')),
+            ],
+            options={
+                'verbose_name': 'Visualização Pendente',
+                'verbose_name_plural': 'Visualizações Pendentes',
+            },
+        ),
+    ]
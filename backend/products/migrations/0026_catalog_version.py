@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:43
+
+import time
+
+from django.db import migrations, models
+
+
+def seed_catalog_versions(apps, schema_editor):
+    # The cache-held versions are gone; start from now so every client's
+    # cached copy revalidates once
+    CatalogVersion = apps.get_model('products', 'CatalogVersion')
+    CatalogVersion.objects.bulk_create([
+        CatalogVersion(name='catalog', version=int(time.time() * 1000)),
+        CatalogVersion(name='product-detail:generation', version=time.time_ns()),
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_product_description_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Nome')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Versão')),
+            ],
+            options={
+                'verbose_name': 'Versão do Catálogo',
+                'verbose_name_plural': 'Versões do Catálogo',
+            },
+        ),
+        migrations.RunPython(seed_catalog_versions, migrations.RunPython.noop),
+    ]
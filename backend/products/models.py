@@ -1,4 +1,7 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -204,6 +207,20 @@ class Product(models.Model):
     view_count = models.PositiveIntegerField(default=0, verbose_name="Visualizações")
     sales_count = models.PositiveIntegerField(default=0, verbose_name="Vendas")
     
+    # Rating aggregates over approved reviews (maintained by products.ratings)
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Soma das Avaliações")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="Total de Avaliações")
+    
+    # Full-text search document (maintained by products.search)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    
+    # WebP variant manifests of the legacy image fields, keyed by field name
+    # (maintained by products.image_jobs)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes das Imagens")
+    
+    # Columns maintained with bulk UPDATEs; full saves must not overwrite them
+    MAINTAINED_FIELDS = ('view_count', 'sales_count', 'rating_sum', 'rating_count', 'search_vector', 'image_variants')
+    
     class Meta:
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
@@ -213,6 +230,19 @@ class Product(models.Model):
             models.Index(fields=['is_featured']),
             models.Index(fields=['is_bestseller']),
             models.Index(fields=['created_at']),
+            # Keyset pagination orders by (field, id)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['stock_quantity', 'id']),
+            models.Index(fields=['view_count', 'id']),
+            models.Index(fields=['sales_count', 'id']),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            # Trigram indexes on UPPER(col) serve both icontains and similarity lookups
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_trgm'),
+            GinIndex(OpClass(Upper('brand'), name='gin_trgm_ops'), name='product_brand_trgm'),
+            GinIndex(OpClass(Upper('sku'), name='gin_trgm_ops'), name='product_sku_trgm'),
+            GinIndex(OpClass(Upper('description'), name='gin_trgm_ops'), name='product_description_trgm'),
         ]
     
     def __str__(self):
@@ -242,6 +272,14 @@ class Product(models.Model):
         # Set original price if not set
         if not self.original_price:
             self.original_price = self.price
+        
+        # A full save of an existing row skips the maintained columns so a
+        # stale instance can't roll back updates applied concurrently
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not self._state.adding:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.MAINTAINED_FIELDS
+            ]
             
         super().save(*args, **kwargs)
     
@@ -313,16 +351,15 @@ class Product(models.Model):
     
     @property
     def average_rating(self):
-        """Calculate average rating from approved reviews"""
-        reviews = self.reviews.filter(status='approved')
-        if not reviews:
+        """Average rating from approved reviews"""
+        if not self.rating_count:
             return 0
-        return round(sum(review.rating for review in reviews) / reviews.count(), 1)
+        return round(self.rating_sum / self.rating_count, 1)
     
     @property
     def total_reviews(self):
-        """Get total number of approved reviews"""
-        return self.reviews.filter(status='approved').count()
+        """Total number of approved reviews"""
+        return self.rating_count
 
 
 class ProductImage(models.Model):
@@ -333,6 +370,8 @@ class ProductImage(models.Model):
     alt_text = models.CharField(max_length=200, blank=True, verbose_name="Texto Alternativo")
     is_main = models.BooleanField(default=False, verbose_name="Imagem Principal")
     order = models.PositiveIntegerField(default=0, verbose_name="Ordem")
+    # WebP variant manifest (maintained by products.image_jobs)
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     
     class Meta:
@@ -356,6 +395,14 @@ class ProductImage(models.Model):
             else:
                 self.order = 1
         
+        # Don't let a full save of a stale instance drop a manifest the
+        # variant worker stored meanwhile
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not self._state.adding:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'variants'
+            ]
+        
         # Save the instance first
         super().save(*args, **kwargs)
         
@@ -423,6 +470,12 @@ class Review(models.Model):
         verbose_name_plural = "Avaliações"
         ordering = ['-created_at']
         # unique_together removido para permitir múltiplas avaliações por usuário/produto
+        indexes = [
+            # Review lists filter on (product, status) and keyset-paginate by (field, id)
+            models.Index(fields=['product', 'status', 'created_at', 'id']),
+            models.Index(fields=['product', 'status', 'rating', 'id']),
+            models.Index(fields=['product', 'status', 'helpful_count', 'id']),
+        ]
         
     def __str__(self):
         return f"Avaliação de {self.user.username} para {self.product.name}"
@@ -432,6 +485,8 @@ class ReviewImage(models.Model):
     """Images attached to a product review for social proof"""
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='images', verbose_name="Avaliação")
     image = models.ImageField(upload_to=review_image_upload_path, verbose_name="Imagem")
+    # WebP thumbnail manifest (maintained by products.image_jobs)
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Enviado em")
 
     class Meta:
@@ -459,3 +514,93 @@ class ReviewHelpfulVote(models.Model):
 
     def __str__(self):
         return f"{self.user_id} votou útil na review {self.review_id}"
+
+
+class CatalogVersion(models.Model):
+    """A named version counter behind the catalog's HTTP and detail caches.
+
+    Kept in the database rather than the cache so every container (web
+    and workers) bumps and reads the same counters, and cache culling can
+    never reset one. See products.catalog.
+    """
+    name = models.CharField(max_length=255, primary_key=True, verbose_name="Nome")
+    version = models.BigIntegerField(default=0, verbose_name="Versão")
+
+    class Meta:
+        verbose_name = "Versão do Catálogo"
+        verbose_name_plural = "Versões do Catálogo"
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+
+class ProductView(models.Model):
+    """A product page view not yet added to Product.view_count.
+
+    Append-only: requests insert rows and products.view_counter drains
+    them into view_count in bulk.
+    """
+    id = models.BigAutoField(primary_key=True)
+    slug = models.CharField(max_length=200, verbose_name="Slug do produto")
+
+    class Meta:
+        verbose_name = "Visualização Pendente"
+        verbose_name_plural = "Visualizações Pendentes"
+
+    def __str__(self):
+        return self.slug
+
+
+class ImageVariantJob(models.Model):
+    """Background job that generates the WebP variants of an uploaded image."""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_PROCESSING, 'Processando'),
+        (STATUS_DONE, 'Concluída'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    image = models.CharField(max_length=255, unique=True, verbose_name="Imagem")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Status")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentativas")
+    last_error = models.TextField(blank=True, verbose_name="Último erro")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Iniciada em")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criada em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizada em")
+
+    class Meta:
+        verbose_name = "Tarefa de Variantes de Imagem"
+        verbose_name_plural = "Tarefas de Variantes de Imagem"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.image} ({self.get_status_display()})"
+
+
+class ImageBlob(models.Model):
+    """A content-addressed image file and how many rows reference it."""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Arquivo")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(verbose_name="Tamanho (bytes)")
+    ref_count = models.IntegerField(default=0, verbose_name="Referências")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Arquivo de Imagem"
+        verbose_name_plural = "Arquivos de Imagem"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} referências)"
@@ -0,0 +1,52 @@
+"""
+Bulk review moderation
+Approves or rejects many reviews with one UPDATE, shared by the admin
+actions and the bulk-moderate API endpoint.
+
+QuerySet.update() skips the Review signals, so everything they would have
+done happens here: rating aggregates are rebuilt once per affected product
+and the review summaries, product details and catalog version are
+invalidated together.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_catalog_version, invalidate_product_detail
+from .models import Review
+from .ratings import invalidate_review_summary, rebuild_rating_aggregates
+
+
+def moderate_reviews(reviews, status, moderator, notes=None):
+    """Set ``status`` on every review in the ``reviews`` queryset.
+
+    ``notes`` replaces the moderation notes when given. Returns
+    ``(updated, review_ids, product_ids)``.
+    """
+    now = timezone.now()
+    fields = {
+        'status': status,
+        'moderated_by': moderator,
+        'moderated_at': now,
+        'admin_seen': True,
+        'updated_at': now,
+    }
+    if notes is not None:
+        fields['moderation_notes'] = notes
+    with transaction.atomic():
+        # Lock the reviews so the set of affected products can't shift under the UPDATE
+        rows = list(
+            reviews.order_by()
+            .select_for_update(of=('self',))
+            .values_list('pk', 'product_id', 'product__slug')
+        )
+        review_ids = {pk for pk, _, _ in rows}
+        updated = Review.objects.filter(pk__in=review_ids).update(**fields)
+        product_ids = {product_id for _, product_id, _ in rows}
+        rebuild_rating_aggregates(product_ids)
+
+    if product_ids:
+        invalidate_review_summary(*product_ids)
+        invalidate_product_detail(*{slug for _, _, slug in rows})
+        bump_catalog_version()
+    return updated, review_ids, product_ids
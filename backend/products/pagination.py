@@ -0,0 +1,238 @@
+"""
+Keyset (cursor) pagination for product listings
+
+Page-number pagination issues a COUNT(*) per page and deep pages scan large
+OFFSETs. Keyset pagination instead filters on the last seen
+``(ordering field, id)`` pair, so every page costs O(page_size) no matter
+how deep the client scrolls. The filter is a single row-value comparison,
+``(field, id) < (value, pk)``, which Postgres turns into the start of an
+index scan on the matching ``(field, id)`` index; the equivalent
+``field < value OR (field = value AND id < pk)`` reads every row before
+the cursor and discards them.
+"""
+
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, Expression, F, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RowComparison(Expression):
+    """``(lhs, ...) <op> (rhs, ...)`` as one SQL row-value comparison."""
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, lhs, op, rhs):
+        super().__init__()
+        self.lhs = list(lhs)
+        self.op = op
+        self.rhs = list(rhs)
+
+    def get_source_expressions(self):
+        return self.lhs + self.rhs
+
+    def set_source_expressions(self, exprs):
+        self.lhs, self.rhs = exprs[:len(self.lhs)], exprs[len(self.lhs):]
+
+    def as_sql(self, compiler, connection):
+        sides = []
+        params = []
+        for side in (self.lhs, self.rhs):
+            parts = []
+            for expr in side:
+                sql, expr_params = compiler.compile(expr)
+                parts.append(sql)
+                params.extend(expr_params)
+            sides.append(f'({", ".join(parts)})')
+        return f'{sides[0]} {self.op} {sides[1]}', params
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on ``(ordering field, id)``.
+
+    The ordering field comes from the view's OrderingFilter (falling back to
+    ``default_ordering``) and ``id`` breaks ties, so pages stay stable even
+    when many rows share a price or a name. No COUNT query is issued.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    default_ordering = '-created_at'
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        # Walking backwards means flipping the sort, then restoring it below
+        scan_descending = descending != reverse
+        prefix = '-' if scan_descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}{self.tiebreaker}')
+
+        if cursor:
+            model_field = queryset.model._meta.get_field(field)
+            try:
+                value = model_field.to_python(cursor['value'])
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(RowComparison(
+                [F(field), F(self.tiebreaker)],
+                '<' if scan_descending else '>',
+                [Value(value, output_field=model_field), Value(cursor['pk'])],
+            ))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """Return the single ordering field requested through OrderingFilter."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            return self.default_ordering
+        return ordering[0]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('utf-8')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            cursor = {
+                'ordering': tokens['o'][0],
+                'value': tokens['v'][0],
+                'pk': int(tokens['k'][0]),
+                'reverse': tokens.get('r', ['0'])[0] == '1',
+            }
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['ordering'] != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse):
+        field = self.ordering.lstrip('-')
+        tokens = {
+            'o': self.ordering,
+            'v': str(getattr(instance, field)),
+            'k': str(getattr(instance, self.tiebreaker)),
+        }
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    """Keyset pagination for a product's reviews, ordered by ``sort_by``.
+
+    ``recent`` (the default), ``highest``, ``lowest`` and ``helpful`` map to
+    ``(field, id)`` orderings served by the Review composite indexes.
+    """
+    sort_param = 'sort_by'
+    sort_orderings = {
+        'recent': '-created_at',
+        'highest': '-rating',
+        'lowest': 'rating',
+        'helpful': '-helpful_count',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.sort_orderings.get(request.query_params.get(self.sort_param), self.default_ordering)
+
+
+class CursorOptInPaginationMixin:
+    """Let clients opt into keyset pagination with ``?pagination=cursor``.
+
+    Requests that already carry a ``cursor`` param stay in cursor mode, so
+    following a ``next`` link never needs the flag repeated. Everything else
+    keeps the default page-number pagination and its ``count``.
+    """
+    cursor_pagination_class = KeysetPagination
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or bool(params.get('cursor'))
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = None if self.pagination_class is None else self.pagination_class()
+        return self._paginator
+
+
+class SearchPagination(PageNumberPagination):
+    """Page-number pagination for product search with a client page size."""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,98 @@
+"""
+Rating aggregates
+Keeps Product.rating_sum / Product.rating_count in step with approved reviews
+and caches the per-product rating distribution shown above review lists
+"""
+
+from django.core.cache import cache
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Coalesce
+
+from .catalog import _now_and_on_commit
+from .models import Product, Review
+
+REVIEW_SUMMARY_TIMEOUT = 60 * 30
+
+
+def review_contribution(status, rating):
+    """Return the (sum, count) a review adds to its product's aggregates."""
+    if status == 'approved':
+        return rating, 1
+    return 0, 0
+
+
+def apply_rating_delta(product_id, sum_delta, count_delta):
+    """Shift a product's aggregates in a single UPDATE (no read-modify-write)."""
+    if not product_id or (not sum_delta and not count_delta):
+        return
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=F('rating_sum') + sum_delta,
+        rating_count=F('rating_count') + count_delta,
+    )
+
+
+def _approved_reviews_aggregate(aggregate):
+    return Coalesce(
+        Subquery(
+            Review.objects.filter(product=OuterRef('pk'), status='approved')
+            .order_by()
+            .values('product')
+            .annotate(value=aggregate)
+            .values('value')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def rebuild_rating_aggregates(product_ids=None):
+    """Recompute aggregates from approved reviews in one UPDATE statement.
+
+    Pass ``product_ids`` to limit the rebuild; returns the number of
+    products updated.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+    return products.update(
+        rating_sum=_approved_reviews_aggregate(Sum('rating')),
+        rating_count=_approved_reviews_aggregate(Count('id')),
+    )
+
+
+def _review_summary_key(product_id):
+    return f'review-summary:{product_id}'
+
+
+def review_summary(product_id):
+    """Return ``{counts, total, average}`` for a product's approved reviews.
+
+    ``counts`` maps every star value (1-5) to its number of reviews. Built
+    with one grouped query and cached until a review of the product changes
+    its contribution (see invalidate_review_summary).
+    """
+    key = _review_summary_key(product_id)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+    counts = {rating: 0 for rating in range(1, 6)}
+    rows = (
+        Review.objects.filter(product_id=product_id, status='approved')
+        .order_by()
+        .values('rating')
+        .annotate(count=Count('id'))
+    )
+    for row in rows:
+        counts[int(row['rating'])] = row['count']
+    total = sum(counts.values())
+    average = sum(rating * count for rating, count in counts.items()) / total if total else 0
+    summary = {'counts': counts, 'total': total, 'average': round(average, 1)}
+    cache.set(key, summary, REVIEW_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_review_summary(*product_ids):
+    """Drop the cached summaries of the given products."""
+    keys = [_review_summary_key(product_id) for product_id in product_ids if product_id]
+    if keys:
+        _now_and_on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,92 @@
+"""
+Product search
+Full-text search is backed by Product.search_vector (GIN indexed) using the
+accent-insensitive ``portuguese_unaccent`` text search configuration created
+in migrations. Typo-tolerant lookups on name/brand/SKU use pg_trgm indexes.
+"""
+
+import re
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest, Upper
+
+from .models import Category, Product
+
+SEARCH_CONFIG = 'portuguese_unaccent'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Matches the expressions of the product_*_trgm indexes
+FUZZY_FIELDS = ('name', 'brand', 'sku')
+
+
+def search_vector_expression():
+    """Weighted document for a product: name/brand > category > descriptions."""
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    return (
+        SearchVector('name', 'brand', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(category_name, weight='B', config=SEARCH_CONFIG) +
+        SearchVector('short_description', weight='C', config=SEARCH_CONFIG) +
+        SearchVector('description', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None):
+    """Recompute search_vector in a single UPDATE; returns rows updated."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.update(search_vector=search_vector_expression())
+
+
+def build_search_query(text):
+    """Turn free text into a tsquery matching every term, the last as a prefix.
+
+    Prefix matching on the final term keeps results useful while the user is
+    still typing ("cami" finds "camisa").
+    """
+    terms = _TERM_RE.findall(text or '')
+    if not terms:
+        return None
+    raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products_queryset(queryset, text):
+    """Filter ``queryset`` by full-text match and order by rank."""
+    query = build_search_query(text)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+    ).order_by('-rank', '-created_at')
+
+
+def exact_sku_queryset(queryset, text):
+    """Products whose SKU equals ``text`` as typed or upper-cased.
+
+    Hits the unique SKU index; SKUs are generated upper-case, but ones
+    entered by hand keep their case.
+    """
+    text = (text or '').strip()
+    if not text or ' ' in text:
+        return queryset.none()
+    return queryset.filter(sku__in={text, text.upper()})
+
+
+def fuzzy_products_queryset(queryset, text):
+    """Filter ``queryset`` by trigram similarity on name, brand or SKU.
+
+    Annotates ``similarity`` (the best of the three) and orders by it,
+    keeping any existing ordering as the tie-breaker.
+    """
+    text = (text or '').strip().upper()
+    if not text:
+        return queryset.none()
+    match = Q()
+    for field in FUZZY_FIELDS:
+        match |= Q(TrigramSimilar(Upper(field), Value(text)))
+    similarity = Greatest(*[TrigramSimilarity(Upper(field), Value(text)) for field in FUZZY_FIELDS])
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return queryset.filter(match).annotate(similarity=similarity).order_by('-similarity', *ordering)
@@ -1,7 +1,55 @@
+from django.db import models, transaction
 from rest_framework import serializers
 from .models import Product, Category, Color, Size, ProductImage, Subcategory, Favorite, Review, ReviewImage, ReviewHelpfulVote
+from .image_jobs import LEGACY_IMAGE_FIELDS, manifest_matches
+from .image_resize import resize_url, resize_widths
+from .image_utils import REVIEW_TARGET_WIDTHS
 from cart.models import OrderItem
 
+
+def _image_sources(name, manifest, request=None):
+    """srcset-ready WebP sources for a stored image, from its variant manifest.
+
+    Returns None until the worker has recorded variants for the file
+    currently stored as ``name``, so clients only advertise URLs that exist.
+    """
+    if not name or not manifest_matches(manifest, name):
+        return None
+    storage = ProductImage._meta.get_field('image').storage
+    variants = []
+    seen_widths = set()
+    for variant in sorted(manifest.get('variants', []), key=lambda v: v['width']):
+        # Originals narrower than a target width yield same-size files
+        if variant['width'] in seen_widths:
+            continue
+        seen_widths.add(variant['width'])
+        url = storage.url(variant['name'])
+        if request:
+            url = request.build_absolute_uri(url)
+        variants.append({
+            'url': url,
+            'width': variant['width'],
+            'height': variant['height'],
+            'bytes': variant['bytes'],
+        })
+    return {
+        'type': 'image/webp',
+        'width': manifest.get('width'),
+        'height': manifest.get('height'),
+        'placeholder': manifest.get('placeholder') or None,
+        'srcset': ', '.join(f"{v['url']} {v['width']}w" for v in variants),
+        'variants': variants,
+    }
+
+
+def _resize_url(name, request=None):
+    """Signed on-demand resize URL for a stored image; clients append ``&w=<width>``."""
+    if not name:
+        return None
+    url = resize_url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
 class ColorSerializer(serializers.ModelSerializer):
     """Serializer for Color model"""
     
@@ -23,11 +71,19 @@ class SizeSerializer(serializers.ModelSerializer):
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for ProductImage model"""
     image_url = serializers.CharField(source='image.url', read_only=True)
+    sources = serializers.SerializerMethodField()
+    resize_url = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'image_url', 'alt_text', 'is_main', 'order', 'created_at']
-        read_only_fields = ['id', 'created_at', 'image_url']
+        fields = ['id', 'product', 'image', 'image_url', 'sources', 'resize_url', 'alt_text', 'is_main', 'order', 'created_at']
+        read_only_fields = ['id', 'created_at', 'image_url', 'sources', 'resize_url']
+
+    def get_sources(self, obj):
+        return _image_sources(obj.image.name, obj.variants, self.context.get('request'))
+
+    def get_resize_url(self, obj):
+        return _resize_url(obj.image.name, self.context.get('request'))
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -65,6 +121,34 @@ class SubcategorySerializer(serializers.ModelSerializer):
     def get_product_count(self, obj):
         return obj.products.filter(status='active').count()
 
+def _main_image_url(obj):
+    """Resolve a product's main image URL.
+
+    Uses the ``main_image_path`` annotation from catalog_queryset() when
+    present so no per-row image queries are issued.
+    """
+    if hasattr(obj, 'main_image_path'):
+        if obj.main_image_path:
+            return ProductImage._meta.get_field('image').storage.url(obj.main_image_path)
+        return obj.main_image.url if obj.main_image else None
+    return obj.get_main_image()
+
+def _main_product_image(obj):
+    """The gallery image Product.get_main_image() picks, read from obj.images.all()."""
+    images = sorted(obj.images.all(), key=lambda image: (not image.is_main, image.order, image.created_at))
+    return images[0] if images else None
+
+def _main_image_file(obj):
+    """``(storage name, variant manifest)`` of a product's main image (see _main_image_url)."""
+    if hasattr(obj, 'main_image_path'):
+        if obj.main_image_path:
+            return obj.main_image_path, obj.main_image_variants
+    else:
+        image = _main_product_image(obj)
+        if image is not None:
+            return image.image.name, image.variants
+    return obj.main_image.name, (obj.image_variants or {}).get('main_image')
+
 class ProductListSerializer(serializers.ModelSerializer):
     """Serializer for Product list view (minimal fields)"""
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -72,6 +156,8 @@ class ProductListSerializer(serializers.ModelSerializer):
     is_low_stock = serializers.BooleanField(read_only=True)
     discount_percentage = serializers.FloatField(read_only=True)
     main_image_url = serializers.SerializerMethodField()
+    main_image_sources = serializers.SerializerMethodField()
+    main_image_resize_url = serializers.SerializerMethodField()
     colors = ColorSerializer(many=True, read_only=True)
     sizes = SizeSerializer(many=True, read_only=True)
     subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
@@ -82,7 +168,7 @@ class ProductListSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'short_description', 'price', 'original_price',
             'is_on_sale', 'stock_quantity', 'status', 'is_featured',
             'is_bestseller', 'category_name', 'subcategory_name', 'brand', 'sku',
-            'main_image_url', 'is_in_stock', 'is_low_stock',
+            'main_image_url', 'main_image_sources', 'main_image_resize_url', 'is_in_stock', 'is_low_stock',
             'discount_percentage', 'view_count', 'sales_count',
             'colors', 'sizes', 'created_at', 'updated_at'
         ]
@@ -92,15 +178,65 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
     
     def get_main_image_url(self, obj):
-        main_image_url = obj.get_main_image()
+        main_image_url = _main_image_url(obj)
         if main_image_url:
             request = self.context.get('request')
             if request:
                 return request.build_absolute_uri(main_image_url)
         return None
 
+    def get_main_image_sources(self, obj):
+        return _image_sources(*_main_image_file(obj), self.context.get('request'))
+
+    def get_main_image_resize_url(self, obj):
+        return _resize_url(_main_image_file(obj)[0], self.context.get('request'))
+
+# Orders whose items make their buyer a verified buyer of the product
+VERIFIED_ORDER_STATUSES = ['paid', 'confirmed', 'processing', 'shipped', 'delivered']
+
+
+class ReviewListSerializer(serializers.ListSerializer):
+    """Resolves ``verified_buyer`` and ``user_has_voted_helpful`` per page.
+
+    One query finds which (author, product) pairs have a qualifying order
+    and one finds the requester's helpful votes, instead of two queries per
+    review; ReviewSerializer reads the results from ``page_flags``.
+    """
+
+    def to_representation(self, data):
+        reviews = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.page_flags = self._page_flags(reviews)
+        try:
+            return super().to_representation(reviews)
+        finally:
+            self.child.page_flags = None
+
+    def _page_flags(self, reviews):
+        verified = set()
+        voted = set()
+        if not reviews:
+            return verified, voted
+        verified = set(OrderItem.objects.filter(
+            order__user_id__in={review.user_id for review in reviews},
+            product_id__in={review.product_id for review in reviews},
+            order__status__in=VERIFIED_ORDER_STATUSES,
+        ).order_by().values_list('order__user_id', 'product_id').distinct())
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if user and user.is_authenticated:
+            voted = set(ReviewHelpfulVote.objects.filter(
+                user=user,
+                review_id__in=[review.pk for review in reviews],
+            ).values_list('review_id', flat=True))
+        return verified, voted
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     """Serializer for Review model"""
+    # (verified (user_id, product_id) pairs, voted review ids) while a
+    # ReviewListSerializer renders a page
+    page_flags = None
+
     user_name = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.EmailField(source='user.email', read_only=True)
     user_first_name = serializers.CharField(source='user.first_name', read_only=True)
@@ -110,6 +246,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     moderation_notes = serializers.CharField(read_only=True)
     status = serializers.CharField(read_only=True)
     images = serializers.SerializerMethodField()
+    image_thumbnails = serializers.SerializerMethodField()
     helpful_count = serializers.IntegerField(read_only=True)
     user_has_voted_helpful = serializers.SerializerMethodField()
     verified_buyer = serializers.SerializerMethodField()
@@ -117,11 +254,13 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Review
+        list_serializer_class = ReviewListSerializer
         fields = [
             'id', 'product', 'user', 'user_name', 'user_email',
             'user_first_name', 'user_last_name',
             'rating', 'comment', 'created_at', 'updated_at',
-            'product_name', 'moderated_by', 'moderation_notes', 'status', 'images', 'helpful_count', 'user_has_voted_helpful', 'verified_buyer'
+            'product_name', 'moderated_by', 'moderation_notes', 'status', 'images', 'image_thumbnails',
+            'helpful_count', 'user_has_voted_helpful', 'verified_buyer'
         ]
         # user should be read-only for create requests; view will attach the user
         read_only_fields = ['id', 'user', 'product', 'user_name', 'user_email', 'user_first_name', 'user_last_name', 'created_at', 'updated_at',
@@ -154,6 +293,7 @@ class ReviewSerializer(serializers.ModelSerializer):
                 ReviewImage.objects.create(review=review, image=f)
         return review
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Update existing review: change rating/comment, reset moderation, append images
         request = self.context.get('request')
@@ -172,20 +312,50 @@ class ReviewSerializer(serializers.ModelSerializer):
         return instance
 
     def get_images(self, obj):
+        """Full-view URL of each photo, never the stored original.
+
+        Originals come straight off a phone with EXIF (GPS position
+        included), so this is the largest WebP variant, or until the worker
+        has made it a resize URL that re-encodes the photo without metadata.
+        """
         request = self.context.get('request')
         urls = []
-        for img in getattr(obj, 'images', []).all() if hasattr(obj, 'images') else []:
-            try:
-                url = img.image.url
-                if request:
-                    urls.append(request.build_absolute_uri(url))
-                else:
-                    urls.append(url)
-            except Exception:
+        for img in obj.images.all():
+            sources = _image_sources(img.image.name, img.variants, request)
+            if sources and sources['variants']:
+                urls.append(sources['variants'][-1]['url'])
                 continue
+            # The largest rendition allowed by the review cap
+            widths = resize_widths()
+            allowed = [w for w in widths if w <= REVIEW_TARGET_WIDTHS[-1]]
+            width = allowed[-1] if allowed else widths[0]
+            url = resize_url(img.image.name, width)
+            urls.append(request.build_absolute_uri(url) if request else url)
         return urls
 
+    def get_image_thumbnails(self, obj):
+        """WebP renditions of each photo, in ``images`` order.
+
+        ``thumbnail`` is the smallest rendition and ``full`` the largest
+        (capped at REVIEW_TARGET_WIDTHS, metadata stripped); an entry is
+        None until the background worker has generated them.
+        """
+        request = self.context.get('request')
+        thumbnails = []
+        for img in obj.images.all():
+            sources = _image_sources(img.image.name, img.variants, request)
+            if sources and sources['variants']:
+                sources = dict(
+                    sources,
+                    thumbnail=sources['variants'][0]['url'],
+                    full=sources['variants'][-1]['url'],
+                )
+            thumbnails.append(sources or None)
+        return thumbnails
+
     def get_user_has_voted_helpful(self, obj):
+        if self.page_flags is not None:
+            return obj.pk in self.page_flags[1]
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if user and user.is_authenticated:
@@ -197,11 +367,13 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     def get_verified_buyer(self, obj):
         """Return True if the review's author has purchased this product."""
+        if self.page_flags is not None:
+            return (obj.user_id, obj.product_id) in self.page_flags[0]
         try:
             return OrderItem.objects.filter(
-                order__user=obj.user,
-                product=obj.product,
-                order__status__in=['paid', 'confirmed', 'processing', 'shipped', 'delivered']
+                order__user_id=obj.user_id,
+                product_id=obj.product_id,
+                order__status__in=VERIFIED_ORDER_STATUSES,
             ).exists()
         except Exception:
             return False
@@ -216,6 +388,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     discount_percentage = serializers.FloatField(read_only=True)
     all_images = serializers.SerializerMethodField()
     main_image_url = serializers.SerializerMethodField()
+    main_image_sources = serializers.SerializerMethodField()
+    image_sources = serializers.SerializerMethodField()
     images = ProductImageSerializer(many=True, read_only=True)
     colors = ColorSerializer(many=True, read_only=True)
     sizes = SizeSerializer(many=True, read_only=True)
@@ -225,7 +399,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     def get_reviews(self, obj):
         # Get the 5 most recent reviews
-        reviews = obj.reviews.all().order_by('-created_at')[:5]
+        reviews = obj.reviews.select_related('user', 'product').prefetch_related('images').order_by('-created_at')[:5]
         return ReviewSerializer(reviews, many=True, context=self.context).data
 
     class Meta:
@@ -234,7 +408,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'id', 'name', 'description', 'short_description', 'category', 'subcategory',
             'category_name', 'subcategory_name', 'sku', 'brand', 'price', 'original_price',
             'is_on_sale', 'stock_quantity', 'min_stock_level',
-            'main_image', 'main_image_url', 'image_2', 'image_3', 'image_4', 'all_images', 'images',
+            'main_image', 'main_image_url', 'main_image_sources', 'image_2', 'image_3', 'image_4',
+            'image_sources', 'all_images', 'images',
             'specifications', 'meta_title', 'meta_description', 'slug',
             'status', 'is_featured', 'is_bestseller', 'weight', 'length',
             'width', 'height', 'colors', 'sizes', 'is_in_stock', 'is_low_stock',
@@ -256,6 +431,20 @@ class ProductDetailSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(main_image_url)
         return None
 
+    def get_main_image_sources(self, obj):
+        return _image_sources(*_main_image_file(obj), self.context.get('request'))
+
+    def get_image_sources(self, obj):
+        """WebP sources of the legacy image fields that have variants, by field name."""
+        request = self.context.get('request')
+        image_variants = obj.image_variants or {}
+        sources = {}
+        for field in LEGACY_IMAGE_FIELDS:
+            field_sources = _image_sources(getattr(obj, field).name, image_variants.get(field), request)
+            if field_sources:
+                sources[field] = field_sources
+        return sources
+
     def get_all_images(self, obj):
         request = self.context.get('request')
         images = []
@@ -1,24 +1,293 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Product, ProductImage
-from .image_utils import generate_webp_variants
+from cart.models import Order, OrderItem
+from .models import Product, ProductImage, Category, Subcategory, Color, Size, Review, ReviewImage
+from .image_jobs import LEGACY_IMAGE_FIELDS, enqueue_image_variants
+from .catalog import (
+    bump_catalog_version,
+    bump_suggest_version,
+    invalidate_product_detail,
+    invalidate_all_product_details,
+)
+from .ratings import review_contribution, apply_rating_delta, invalidate_review_summary
+from .search import update_search_vectors
+from .serializers import VERIFIED_ORDER_STATUSES
+from .storage import update_image_refs
+
+logger = logging.getLogger(__name__)
+
+# Saves that only touch analytics counters don't change what the catalog shows
+ANALYTICS_FIELDS = frozenset({'view_count', 'sales_count'})
 
+# Product fields held by the search suggest index
+SUGGEST_FIELDS = ('slug', 'name', 'brand', 'status')
 
-def _ensure_variants_for_field(instance, field_name: str):
+
+def _ensure_variants_for_field(instance, field_name: str, manifest=None):
+    # Variants are generated by the process_image_jobs worker, off the request
     file_field = getattr(instance, field_name, None)
     try:
-        if file_field and getattr(file_field, 'path', None):
-            generate_webp_variants(file_field.path)
+        if file_field:
+            # Savepoint so a queue error can't poison the caller's transaction
+            with transaction.atomic():
+                enqueue_image_variants(file_field.name, manifest)
     except Exception:
-        pass
+        logger.exception('Could not queue WebP variants for %s', getattr(file_field, 'name', None))
+
+
+def _product_slug(product_id):
+    return Product.objects.filter(pk=product_id).values_list('slug', flat=True).first()
 
 
 @receiver(post_save, sender=ProductImage)
-def productimage_post_save(sender, instance: ProductImage, created, **kwargs):
-    _ensure_variants_for_field(instance, 'image')
+@receiver(post_save, sender=ReviewImage)
+def image_variants_post_save(sender, instance, created, **kwargs):
+    _ensure_variants_for_field(instance, 'image', instance.variants)
 
 
 @receiver(post_save, sender=Product)
 def product_post_save(sender, instance: Product, created, **kwargs):
+    image_variants = instance.image_variants or {}
     for field in ['main_image', 'image_2', 'image_3', 'image_4']:
-        _ensure_variants_for_field(instance, field)
+        _ensure_variants_for_field(instance, field, image_variants.get(field))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=ReviewImage)
+def catalog_post_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= ANALYTICS_FIELDS:
+        return
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=ReviewImage)
+def catalog_post_delete(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.colors.through)
+@receiver(m2m_changed, sender=Product.sizes.through)
+def catalog_m2m_changed(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    bump_catalog_version()
+    if isinstance(instance, Product):
+        invalidate_product_detail(instance.slug)
+    else:
+        invalidate_all_product_details()
+
+
+# Product detail cache invalidation
+
+@receiver(pre_save, sender=Product)
+def product_remember_state(sender, instance: Product, **kwargs):
+    # A renamed slug must drop the body cached under the old one, renames
+    # and status changes reach the suggest index, and replaced images
+    # release their stored files
+    previous = None
+    if instance.pk:
+        previous = Product.objects.filter(pk=instance.pk).values(*SUGGEST_FIELDS, *LEGACY_IMAGE_FIELDS).first()
+    instance._previous_slug = previous['slug'] if previous else None
+    instance._previous_suggest = tuple(previous[field] for field in SUGGEST_FIELDS) if previous else None
+    instance._previous_image_names = [previous[field] for field in LEGACY_IMAGE_FIELDS] if previous else []
+
+
+@receiver(post_save, sender=Product)
+def product_detail_post_save(sender, instance: Product, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= ANALYTICS_FIELDS:
+        return
+    invalidate_product_detail(instance.slug, getattr(instance, '_previous_slug', None))
+
+
+@receiver(post_delete, sender=Product)
+def product_detail_post_delete(sender, instance: Product, **kwargs):
+    invalidate_product_detail(instance.slug)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def product_child_changed(sender, instance, **kwargs):
+    invalidate_product_detail(_product_slug(instance.product_id))
+
+
+@receiver(post_save, sender=ReviewImage)
+@receiver(post_delete, sender=ReviewImage)
+def review_image_changed(sender, instance: ReviewImage, **kwargs):
+    slug = Review.objects.filter(pk=instance.review_id).values_list('product__slug', flat=True).first()
+    invalidate_product_detail(slug)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+def shared_lookup_changed(sender, instance, **kwargs):
+    # Names and codes are embedded in every detail body that references them
+    invalidate_all_product_details()
+
+
+# Search suggest index
+
+@receiver(post_save, sender=Product)
+def product_suggest_post_save(sender, instance: Product, created, **kwargs):
+    current = tuple(getattr(instance, field) for field in SUGGEST_FIELDS)
+    if created or current != getattr(instance, '_previous_suggest', None):
+        bump_suggest_version()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def suggest_source_changed(sender, instance, **kwargs):
+    bump_suggest_version()
+
+
+# Rating aggregates
+
+@receiver(pre_save, sender=Review)
+def review_remember_rating(sender, instance: Review, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Review.objects.filter(pk=instance.pk).values('product_id', 'status', 'rating').first()
+    instance._previous_rating_state = previous
+
+
+@receiver(post_save, sender=Review)
+def review_rating_post_save(sender, instance: Review, **kwargs):
+    previous = getattr(instance, '_previous_rating_state', None)
+    new_sum, new_count = review_contribution(instance.status, instance.rating)
+    if previous and previous['product_id'] != instance.product_id:
+        old_sum, old_count = review_contribution(previous['status'], previous['rating'])
+        apply_rating_delta(previous['product_id'], -old_sum, -old_count)
+        if old_count:
+            invalidate_review_summary(previous['product_id'])
+        previous = None
+    old_sum, old_count = review_contribution(previous['status'], previous['rating']) if previous else (0, 0)
+    apply_rating_delta(instance.product_id, new_sum - old_sum, new_count - old_count)
+    if (new_sum, new_count) != (old_sum, old_count):
+        invalidate_review_summary(instance.product_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_rating_post_delete(sender, instance: Review, **kwargs):
+    old_sum, old_count = review_contribution(instance.status, instance.rating)
+    apply_rating_delta(instance.product_id, -old_sum, -old_count)
+    if old_count:
+        invalidate_review_summary(instance.product_id)
+
+
+# Verified-buyer flags in cached product details
+
+def _invalidate_reviewed_products(user_id, product_ids):
+    """Drop the detail bodies of ``product_ids`` that show a review by ``user_id``."""
+    if not user_id:
+        return
+    slugs = Product.objects.filter(
+        pk__in=product_ids, reviews__user_id=user_id,
+    ).values_list('slug', flat=True).distinct()
+    invalidate_product_detail(*slugs)
+
+
+@receiver(pre_save, sender=Order)
+def order_remember_status(sender, instance: Order, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    instance._previous_status = previous
+
+
+@receiver(post_save, sender=Order)
+def order_verified_buyer_post_save(sender, instance: Order, **kwargs):
+    was_verified = getattr(instance, '_previous_status', None) in VERIFIED_ORDER_STATUSES
+    if was_verified != (instance.status in VERIFIED_ORDER_STATUSES):
+        _invalidate_reviewed_products(instance.user_id, instance.items.values('product_id'))
+
+
+@receiver(pre_delete, sender=Order)
+def order_verified_buyer_pre_delete(sender, instance: Order, **kwargs):
+    # Before the cascade removes the items
+    if instance.status in VERIFIED_ORDER_STATUSES:
+        _invalidate_reviewed_products(instance.user_id, instance.items.values('product_id'))
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_verified_buyer_changed(sender, instance: OrderItem, **kwargs):
+    if not instance.product_id:
+        return
+    order = Order.objects.filter(pk=instance.order_id).values('user_id', 'status').first()
+    if order and order['status'] in VERIFIED_ORDER_STATUSES:
+        _invalidate_reviewed_products(order['user_id'], [instance.product_id])
+
+
+# Full-text search document
+
+@receiver(post_save, sender=Product)
+def product_search_post_save(sender, instance: Product, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= ANALYTICS_FIELDS:
+        return
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def category_search_post_save(sender, instance: Category, **kwargs):
+    # The category name is part of every product document in it
+    update_search_vectors(Product.objects.filter(category_id=instance.pk))
+
+
+# Stored image reference counts
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=ReviewImage)
+def image_remember_name(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).values_list('image', flat=True).first() if instance.pk else None
+    instance._previous_image_names = [previous]
+
+
+@receiver(post_save, sender=Product)
+def product_image_refs_post_save(sender, instance: Product, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(LEGACY_IMAGE_FIELDS):
+        return
+    update_image_refs(
+        added=[getattr(instance, field).name for field in LEGACY_IMAGE_FIELDS],
+        removed=getattr(instance, '_previous_image_names', []),
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=ReviewImage)
+def image_refs_post_save(sender, instance, **kwargs):
+    update_image_refs(added=[instance.image.name], removed=getattr(instance, '_previous_image_names', []))
+
+
+@receiver(post_delete, sender=Product)
+def product_image_refs_post_delete(sender, instance: Product, **kwargs):
+    update_image_refs(removed=[getattr(instance, field).name for field in LEGACY_IMAGE_FIELDS])
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ReviewImage)
+def image_refs_post_delete(sender, instance, **kwargs):
+    update_image_refs(removed=[instance.image.name])
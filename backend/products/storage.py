@@ -0,0 +1,85 @@
+"""
+Content-addressed media storage
+Uploaded files are stored under the SHA-256 of their bytes
+(``<prefix>/<aa>/<sha256>.<ext>``, where ``prefix`` is the first segment
+of the upload_to path, e.g. ``products``). Saving bytes that are already
+stored returns the existing name without writing anything (it only
+refreshes the file's mtime), so re-uploads and duplicated products share
+one file and, because WebP variants and their manifests are keyed by the
+file name, one variant set.
+
+Each stored file has an ImageBlob row whose ref_count is kept in step with
+the model rows that point at it (see products.signals). Unreferenced
+blobs are left on disk for the media garbage collector, so a file that
+is saved and referenced a moment later is never deleted in between. A save
+touches the blob row before the file, and the collector locks the row
+before deleting, so the two can't interleave.
+"""
+
+import hashlib
+import os
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+
+def content_hash(content):
+    """SHA-256 hex digest and size of a File, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest(), size
+
+
+def content_addressed_name(name, digest):
+    prefix = name.replace('\\', '/').split('/', 1)[0] if '/' in name else 'uploads'
+    ext = os.path.splitext(name)[1].lower()
+    return f'{prefix}/{digest[:2]}/{digest}{ext}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files after their content."""
+
+    def _save(self, name, content):
+        from .models import ImageBlob
+
+        digest, size = content_hash(content)
+        target = content_addressed_name(name, digest)
+        # Saving (not just creating) refreshes updated_at, which the media
+        # garbage collector's grace period is measured from. It waits on the
+        # row lock of a collection in progress, which then has already
+        # removed the file and gets it written again below.
+        ImageBlob.objects.update_or_create(name=target, defaults={'sha256': digest, 'size': size})
+        try:
+            # A dedupe hit: the collector also checks the mtime
+            os.utime(self.path(target))
+        except FileNotFoundError:
+            saved = super()._save(target, content)
+            if saved != target:
+                # A concurrent save of the same bytes wrote it first; this
+                # suffixed copy is still tracked and works, it just isn't shared
+                ImageBlob.objects.update_or_create(name=saved, defaults={'sha256': digest, 'size': size})
+            target = saved
+        return target
+
+
+def update_image_refs(added=(), removed=()):
+    """Adjust ImageBlob.ref_count for storage names gained and lost by a row.
+
+    Names without a blob (files stored before content addressing) are
+    ignored.
+    """
+    from .models import ImageBlob
+
+    deltas = Counter(name for name in added if name)
+    deltas.subtract(name for name in removed if name)
+    for name, delta in deltas.items():
+        if delta:
+            ImageBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta)
@@ -0,0 +1,162 @@
+"""
+Search box suggestions
+Served from a per-worker in-memory prefix index of active product names,
+brands and categories. The index remembers the suggest version it was built
+from and is rebuilt on the next request after the version moves, so a
+suggestion costs one version lookup. That version only moves with the
+fields indexed here (see catalog.get_suggest_version); sales_count ranking
+is refreshed by the next such change.
+"""
+
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+from .catalog import get_suggest_version
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Single letters match most of the catalog and cost far more than they help
+MIN_QUERY_LENGTH = 2
+
+
+def normalize(text):
+    """Lower-case and strip accents so "Câm" matches "camera"."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    return _TERM_RE.findall(normalize(text))
+
+
+class PrefixIndex:
+    """Sorted token list mapping word prefixes to items.
+
+    ``items`` are ``(text, payload)`` pairs in rank order; the position of
+    an item is its rank, so the best matches are the smallest positions.
+    """
+
+    def __init__(self, items):
+        self.payloads = []
+        self._names = []
+        self._tokens = []
+        pairs = []
+        for position, (text, payload) in enumerate(items):
+            tokens = tuple(set(tokenize(text)))
+            self.payloads.append(payload)
+            self._names.append(normalize(text))
+            self._tokens.append(tokens)
+            pairs.extend((token, position) for token in tokens)
+        pairs.sort()
+        self._keys = [token for token, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _prefix_range(self, prefix):
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def search(self, query, limit):
+        """Return up to ``limit`` payloads whose words start with every query word."""
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+        ranges = [(self._prefix_range(term), term) for term in terms]
+        # Scan the narrowest range and check the remaining terms per item
+        ranges.sort(key=lambda entry: entry[0][1] - entry[0][0])
+        (lo, hi), _ = ranges[0]
+        others = [term for _, term in ranges[1:]]
+        candidates = {
+            position for position in self._positions[lo:hi]
+            if all(any(token.startswith(term) for token in self._tokens[position]) for term in others)
+        }
+        # Items whose whole name starts with the query come first, then by rank
+        phrase = ' '.join(terms)
+        best = heapq.nsmallest(
+            limit, candidates,
+            key=lambda position: (not self._names[position].startswith(phrase), position),
+        )
+        return [self.payloads[position] for position in best]
+
+
+class SuggestIndex:
+    """Prefix indexes for products, brands and categories at one suggest version."""
+
+    def __init__(self, version, products, brands, categories):
+        self.version = version
+        self.products = products
+        self.brands = brands
+        self.categories = categories
+
+    @classmethod
+    def build(cls, version):
+        rows = list(
+            Product.objects.filter(status='active')
+            .order_by('-sales_count', 'name', 'id')
+            .values_list('id', 'slug', 'name', 'brand')
+        )
+        products = PrefixIndex(
+            (f'{name} {brand}', {'id': pk, 'slug': slug, 'name': name})
+            for pk, slug, name, brand in rows
+        )
+        # Brands ranked by how many active products carry them
+        brand_counts = Counter(brand.strip() for _, _, _, brand in rows if brand and brand.strip())
+        brands = PrefixIndex(
+            (brand, brand) for brand, _ in sorted(brand_counts.items(), key=lambda item: (-item[1], item[0]))
+        )
+        categories = PrefixIndex(
+            (name, {'id': pk, 'name': name})
+            for pk, name in Category.objects.filter(is_active=True).order_by('order', 'name').values_list('id', 'name')
+        )
+        return cls(version, products, brands, categories)
+
+    def suggest(self, query, limit):
+        return {
+            'products': self.products.search(query, limit),
+            'brands': self.brands.search(query, limit),
+            'categories': self.categories.search(query, limit),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggest_index():
+    """Return this worker's index, rebuilding it if the suggest version has moved.
+
+    One thread rebuilds while the others keep answering from the previous
+    index, so a catalog edit never stalls the search box.
+    """
+    global _index
+    version = get_suggest_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    if not _index_lock.acquire(blocking=index is None):
+        return index
+    try:
+        if _index is None or _index.version != version:
+            _index = SuggestIndex.build(version)
+            logger.debug('Rebuilt suggest index at suggest version %s (%d products)', version, len(_index.products))
+        return _index
+    finally:
+        _index_lock.release()
+
+
+def reset_suggest_index():
+    """Drop this worker's index so the next request rebuilds it."""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,41 @@
+"""
+Shared fixtures for the image and media tests
+Uploaded-image factories and a mixin that points MEDIA_ROOT at a fresh
+temporary folder for every test and removes it afterwards.
+"""
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+
+
+def png(name='foto.png', size=(400, 300), color=(200, 30, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def jpeg(name='foto.jpg', size=(64, 48)):
+    buffer = BytesIO()
+    # Noise doesn't compress, so the file size follows the pixel count
+    Image.effect_noise(size, 100).convert('RGB').save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class TempMediaRootMixin:
+    """Runs each test against its own empty MEDIA_ROOT (``self.media_root``)."""
+
+    def media_settings(self):
+        """Extra settings to override alongside MEDIA_ROOT."""
+        return {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, **self.media_settings())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
@@ -0,0 +1,59 @@
+import json
+import os
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from PIL import Image
+
+from products.image_utils import _variant_path, variant_widths
+
+from .media import TempMediaRootMixin
+
+
+class BackfillImageVariantsTests(TempMediaRootMixin, TransactionTestCase):
+    """The command closes connections around its pool, so it runs outside a test transaction."""
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.media_root, 'backfill.json')
+        self.paths = []
+        for folder in ('products/1', 'products/2', 'reviews/1'):
+            os.makedirs(os.path.join(self.media_root, folder))
+            path = os.path.join(self.media_root, folder, 'foto.jpg')
+            Image.new('RGB', (700, 500), (20, 120, 200)).save(path, format='JPEG')
+            self.paths.append(path)
+
+    def _backfill(self, *args):
+        out = StringIO()
+        call_command(
+            'backfill_image_variants', '--workers', '1', '--batch', '1',
+            '--checkpoint', self.checkpoint, *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def _has_variants(self, path):
+        widths = variant_widths(os.path.relpath(path, self.media_root))
+        return all(os.path.exists(_variant_path(path, width)) for width in widths)
+
+    def test_dry_run_estimates_without_writing(self):
+        output = self._backfill('--dry-run')
+        self.assertIn('A regenerar: 3 imagens', output)
+        self.assertFalse(any(self._has_variants(path) for path in self.paths))
+
+    def test_generates_missing_variants_and_clears_checkpoint(self):
+        output = self._backfill()
+        self.assertIn('3 imagens verificadas, 3 com variantes regeneradas, 0 falhas', output)
+        self.assertTrue(all(self._has_variants(path) for path in self.paths))
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # Variants are not picked up as originals on the next run
+        self.assertIn('3 imagens verificadas, 0 com variantes regeneradas', self._backfill())
+
+    def test_resumes_after_checkpointed_file(self):
+        with open(self.checkpoint, 'w') as fh:
+            json.dump({'last': 'products/1/foto.jpg', 'done': 1, 'regenerated': 1, 'failed': []}, fh)
+        output = self._backfill()
+        self.assertIn('2 imagens a verificar', output)
+        self.assertIn('3 imagens verificadas, 3 com variantes regeneradas', output)
+        self.assertFalse(self._has_variants(self.paths[0]))
+        self.assertTrue(self._has_variants(self.paths[1]) and self._has_variants(self.paths[2]))
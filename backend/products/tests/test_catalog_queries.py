@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Subcategory, Color, Size, Product, ProductImage
+
+
+class CatalogListingQueryBudgetTests(TestCase):
+    """Listing endpoints must serve a page in a constant number of queries."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Roupas')
+        self.subcategory = Subcategory.objects.create(category=self.category, name='Camisas')
+        self.colors = [Color.objects.create(name=n, hex_code='#000000') for n in ('Preto', 'Branco')]
+        self.sizes = [Size.objects.create(name=n, abbreviation=n[0]) for n in ('Pequeno', 'Médio')]
+
+    def _create_products(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name=f'Produto {i}',
+                description='Descrição',
+                category=self.category,
+                subcategory=self.subcategory,
+                price='100.00',
+                stock_quantity=10,
+                is_featured=True,
+                is_bestseller=True,
+                is_on_sale=True,
+            )
+            product.colors.set(self.colors)
+            product.sizes.set(self.sizes)
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/a.jpg', order=1)
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/b.jpg', order=2, is_main=True)
+
+    def _assert_constant_queries(self, url, expected):
+        self._create_products(3)
+        with self.assertNumQueries(expected):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        cache.clear()
+        self._create_products(5)
+        with self.assertNumQueries(expected):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_product_list(self):
+        # catalog version + count + page + colors + sizes
+        data = self._assert_constant_queries('/api/products/', 5)
+        first = data['results'][0]
+        self.assertTrue(first['main_image_url'].endswith('/b.jpg'))
+        self.assertEqual(first['subcategory_name'], 'Camisas')
+        self.assertEqual(len(first['colors']), 2)
+        self.assertEqual(len(first['sizes']), 2)
+
+    def test_featured_products(self):
+        self._assert_constant_queries('/api/products/featured/', 3)
+
+    def test_bestseller_products(self):
+        self._assert_constant_queries('/api/products/bestsellers/', 3)
+
+    def test_sale_products(self):
+        self._assert_constant_queries('/api/products/sale/', 3)
+
+    def test_products_by_category(self):
+        # category lookup + category product_count + products + colors + sizes
+        self._assert_constant_queries(f'/api/products/category/{self.category.id}/', 5)
+
+    def test_search_products(self):
+        self._assert_constant_queries('/api/products/search/?q=Produto', 3)
+
+    def test_main_image_falls_back_to_legacy_field(self):
+        product = Product.objects.create(
+            name='Legado', description='x', category=self.category, price='10.00',
+            main_image='products/legacy/main.jpg',
+        )
+        res = self.client.get('/api/products/')
+        row = next(r for r in res.json()['results'] if r['id'] == product.id)
+        self.assertTrue(row['main_image_url'].endswith('/products/legacy/main.jpg'))
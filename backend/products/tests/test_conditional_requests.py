@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Color, Product
+
+
+class CatalogConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Eletrónicos')
+        self.product = Product.objects.create(
+            name='Fone', description='x', category=self.category, price='50.00', stock_quantity=3,
+        )
+
+    def _revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        self.assertIn('no-cache', first['Cache-Control'])
+        return first['ETag']
+
+    def test_matching_etag_returns_304_after_one_version_lookup(self):
+        for url in ['/api/products/', f'/api/products/{self.product.slug}/?preview=1',
+                    '/api/categories/', '/api/colors/', '/api/sizes/']:
+            etag = self._revalidate(url)
+            with self.assertNumQueries(1):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, 304, url)
+
+    def test_product_change_invalidates_etag(self):
+        etag = self._revalidate('/api/products/')
+        self.product.price = '45.00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        res = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_color_change_invalidates_etag(self):
+        etag = self._revalidate('/api/colors/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Color.objects.create(name='Azul', hex_code='#0000FF')
+        res = self.client.get('/api/colors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+
+    def test_view_count_save_keeps_etag(self):
+        etag = self._revalidate('/api/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.increment_view_count()
+        res = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+    def test_etag_survives_a_cache_flush(self):
+        # The version lives in the database, shared with worker containers
+        etag = self._revalidate('/api/products/')
+        cache.clear()
+        res = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
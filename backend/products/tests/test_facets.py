@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from products.models import Category, Color, Product, Size, Subcategory
+
+
+@override_settings(PRODUCT_PRICE_FACET_BOUNDS=[100, 500])
+class ProductFacetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Calçado')
+        other = Category.objects.create(name='Casa')
+        self.sport = Subcategory.objects.create(category=self.category, name='Desporto')
+        self.red = Color.objects.create(name='Vermelho', hex_code='#FF0000')
+        self.blue = Color.objects.create(name='Azul', hex_code='#0000FF')
+        self.size_40 = Size.objects.create(name='40', abbreviation='40')
+
+        def product(name, price, brand='', subcategory=None, colors=(), sizes=(), **extra):
+            item = Product.objects.create(
+                name=name, description='x', category=extra.pop('category', self.category),
+                subcategory=subcategory, brand=brand, price=price, **extra,
+            )
+            item.colors.set(colors)
+            item.sizes.set(sizes)
+            return item
+
+        product('Runner', '80.00', 'Nike', self.sport, [self.red, self.blue], [self.size_40], stock_quantity=3)
+        product('Trail', '300.00', 'Nike', self.sport, [self.red], stock_quantity=0)
+        product('Chinelo', '900.00', 'Havaianas', colors=[self.blue])
+        product('Escondido', '50.00', 'Nike', status='inactive')
+        product('Caneca', '20.00', 'Casa Bela', category=other)
+
+    def _facets(self, **params):
+        res = self.client.get('/api/products/facets/', params)
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_counts_every_facet_in_two_queries(self):
+        # +1 for django-filter validating the category id, +1 for the catalog version
+        with self.assertNumQueries(4):
+            data = self._facets(category=self.category.id)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['brands'], [{'name': 'Nike', 'count': 2}, {'name': 'Havaianas', 'count': 1}])
+        self.assertEqual(data['subcategories'], [{'id': self.sport.id, 'name': 'Desporto', 'count': 2}])
+        self.assertEqual(data['colors'], [
+            {'id': self.blue.id, 'name': 'Azul', 'count': 2},
+            {'id': self.red.id, 'name': 'Vermelho', 'count': 2},
+        ])
+        self.assertEqual(data['sizes'], [{'id': self.size_40.id, 'name': '40', 'count': 1}])
+        self.assertEqual(data['price_ranges'], [
+            {'min': 0, 'max': 100, 'count': 1},
+            {'min': 100, 'max': 500, 'count': 1},
+            {'min': 500, 'max': None, 'count': 1},
+        ])
+
+    def test_respects_listing_filters(self):
+        data = self._facets(category=self.category.id, in_stock='true', max_price='500')
+        self.assertEqual(data['count'], 1)
+        self.assertEqual([c['count'] for c in data['colors']], [1, 1])
+
+    def test_cached_by_filter_signature(self):
+        self._facets(category=self.category.id, page=1)
+        with self.assertNumQueries(1):
+            self._facets(category=self.category.id, page=2, ordering='price')
+        with self.assertNumQueries(4):
+            self._facets(category=self.category.id, in_stock='true')
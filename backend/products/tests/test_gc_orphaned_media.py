@@ -0,0 +1,105 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from products.image_jobs import process_pending
+from products.image_utils import _variant_path
+from products.management.commands import gc_orphaned_media
+from products.models import Category, ImageBlob, Product, ProductImage
+
+from .media import TempMediaRootMixin, png
+
+
+class GcOrphanedMediaTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+        self.kept = ProductImage.objects.create(product=self.product, image=png())
+        deleted = ProductImage.objects.create(product=self.product, image=png(color=(0, 0, 255)))
+        process_pending()
+        self.deleted_name = deleted.image.name
+        deleted.delete()
+        self.tmp_upload = os.path.join(self.media_root, 'products', 'tmp', 'ab12cd34', 'abandonada.jpg')
+        os.makedirs(os.path.dirname(self.tmp_upload))
+        with open(self.tmp_upload, 'wb') as fh:
+            fh.write(b'x' * 100)
+        self._age_everything()
+
+    def _age_everything(self, hours=48):
+        then = time.time() - hours * 3600
+        for dirpath, _, filenames in os.walk(self.media_root):
+            for filename in filenames:
+                os.utime(os.path.join(dirpath, filename), (then, then))
+        ImageBlob.objects.update(updated_at=timezone.now() - timedelta(hours=hours))
+
+    def _files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, filename), self.media_root)
+            for dirpath, _, filenames in os.walk(self.media_root)
+            for filename in filenames
+        )
+
+    def _gc(self, *args):
+        out = StringIO()
+        call_command('gc_orphaned_media', '--workers', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_without_deleting(self):
+        files = self._files()
+        output = self._gc('--dry-run')
+        # The deleted image, its three variants and the abandoned upload
+        self.assertIn('Órfãos: 5', output)
+        self.assertEqual(self._files(), files)
+
+    def test_deletes_orphans_and_their_variants(self):
+        kept_stem = os.path.splitext(self.kept.image.name)[0]
+        self._gc()
+        files = self._files()
+        self.assertTrue(files)
+        self.assertTrue(all(name.startswith(kept_stem) for name in files), files)
+        self.assertFalse(os.path.exists(os.path.dirname(self.tmp_upload)))
+        self.assertFalse(ImageBlob.objects.filter(name=self.deleted_name).exists())
+        self.assertTrue(ImageBlob.objects.filter(name=self.kept.image.name).exists())
+
+    def test_recent_orphans_are_kept(self):
+        os.utime(self.tmp_upload)
+        blob = ImageBlob.objects.get(name=self.deleted_name)
+        blob.save()
+        output = self._gc()
+        self.assertIn('Órfãos: 0', output)
+        self.assertIn('2 no período de carência', output)
+        self.assertTrue(os.path.exists(self.tmp_upload))
+        # A re-saved blob keeps its variants too
+        deleted_path = os.path.join(self.media_root, self.deleted_name)
+        self.assertTrue(os.path.exists(deleted_path))
+        self.assertTrue(os.path.exists(_variant_path(deleted_path, 320)))
+
+    def test_saving_stored_bytes_again_refreshes_the_file(self):
+        deleted_path = os.path.join(self.media_root, self.deleted_name)
+        image = ProductImage.objects.create(product=self.product, image=png(color=(0, 0, 255)))
+        self.assertEqual(image.image.name, self.deleted_name)
+        self.assertGreater(os.path.getmtime(deleted_path), time.time() - 60)
+
+    def test_reupload_after_the_listing_survives(self):
+        find_orphans = gc_orphaned_media.find_orphans
+
+        def reupload_then_list(*args):
+            found = find_orphans(*args)
+            ProductImage.objects.create(product=self.product, image=png(color=(0, 0, 255)))
+            # Rule out the mtime check so only the locked re-check can spare it
+            self._age_everything()
+            return found
+
+        with mock.patch.object(gc_orphaned_media, 'find_orphans', side_effect=reupload_then_list):
+            self._gc()
+        deleted_path = os.path.join(self.media_root, self.deleted_name)
+        self.assertTrue(os.path.exists(deleted_path))
+        self.assertTrue(os.path.exists(_variant_path(deleted_path, 320)))
+        self.assertFalse(os.path.exists(self.tmp_upload))
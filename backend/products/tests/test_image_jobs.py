@@ -0,0 +1,201 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from PIL import Image
+from rest_framework.test import APIClient
+
+from products.image_jobs import process_pending
+from products.image_utils import REVIEW_TARGET_WIDTHS, TARGET_WIDTHS, _variant_path
+from products.models import Category, ImageVariantJob, Product, ProductImage, Review, ReviewImage
+
+from .media import TempMediaRootMixin, png
+
+# Wider than every target width, so each variant is a real downscale
+ORIGINAL_SIZE = (1200, 800)
+
+
+class ImageVariantJobTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+
+    def _variants(self, image):
+        return [_variant_path(image.path, width) for width in TARGET_WIDTHS]
+
+    def test_upload_only_queues_the_job(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        job = ImageVariantJob.objects.get(image=image.image.name)
+        self.assertEqual(job.status, ImageVariantJob.STATUS_PENDING)
+        self.assertFalse(any(os.path.exists(path) for path in self._variants(image.image)))
+
+    def test_worker_generates_variants_and_marks_done(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        self.assertEqual(process_pending(), 1)
+        job = ImageVariantJob.objects.get(image=image.image.name)
+        self.assertEqual((job.status, job.attempts), (ImageVariantJob.STATUS_DONE, 1))
+        self.assertTrue(all(os.path.exists(path) for path in self._variants(image.image)))
+        with Image.open(self._variants(image.image)[0]) as variant:
+            self.assertEqual((variant.format, variant.width), ('WEBP', TARGET_WIDTHS[0]))
+        self.assertEqual(process_pending(), 0)
+
+    def test_saving_with_current_variants_does_not_requeue(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        process_pending()
+        image.alt_text = 'Vaso azul'
+        image.save()
+        self.assertEqual(ImageVariantJob.objects.get(image=image.image.name).status, ImageVariantJob.STATUS_DONE)
+
+    def test_missing_original_fails_without_retry(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        os.remove(image.image.path)
+        process_pending()
+        job = ImageVariantJob.objects.get(image=image.image.name)
+        self.assertEqual(job.status, ImageVariantJob.STATUS_FAILED)
+        self.assertIn('FileNotFoundError', job.last_error)
+
+    def test_unreadable_image_is_retried_then_failed(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        with open(image.image.path, 'wb') as fh:
+            fh.write(b'not an image')
+        for _ in range(3):
+            process_pending()
+        job = ImageVariantJob.objects.get(image=image.image.name)
+        self.assertEqual((job.status, job.attempts), (ImageVariantJob.STATUS_FAILED, 3))
+
+    def test_pool_processes_a_batch_concurrently(self):
+        # Distinct bytes, so each upload is its own stored file
+        images = [
+            ProductImage.objects.create(
+                product=self.product, image=png(f'foto{i}.png', size=ORIGINAL_SIZE, color=(i, 30, 30)),
+            )
+            for i in range(3)
+        ]
+        with open(images[1].image.path, 'wb') as fh:
+            fh.write(b'not an image')
+        pool = ProcessPoolExecutor(max_workers=2)
+        try:
+            self.assertEqual(process_pending(10, pool), 3)
+        finally:
+            pool.shutdown()
+        statuses = dict(ImageVariantJob.objects.values_list('image', 'status'))
+        self.assertEqual(statuses[images[0].image.name], ImageVariantJob.STATUS_DONE)
+        # Failed attempts go back to the queue, reported per file
+        self.assertEqual(statuses[images[1].image.name], ImageVariantJob.STATUS_PENDING)
+        self.assertEqual(statuses[images[2].image.name], ImageVariantJob.STATUS_DONE)
+        self.assertTrue(all(os.path.exists(path) for path in self._variants(images[2].image)))
+
+
+class VariantManifestTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.client = APIClient()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(
+            name='Vaso', description='x', category=category, price='10.00', stock_quantity=5,
+        )
+
+    def test_worker_stores_manifest_on_gallery_image(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=(800, 600)))
+        process_pending()
+        image.refresh_from_db()
+        self.assertEqual((image.variants['src'], image.variants['width']), (image.image.name, 800))
+        by_width = {os.path.basename(v['name']): v for v in image.variants['variants']}
+        stem = os.path.splitext(os.path.basename(image.image.name))[0]
+        # The 1024 file keeps its name but is never upscaled
+        self.assertEqual(by_width[f'{stem}-1024.webp']['width'], 800)
+        self.assertEqual(by_width[f'{stem}-320.webp']['height'], 240)
+        self.assertEqual(
+            by_width[f'{stem}-640.webp']['bytes'],
+            os.path.getsize(_variant_path(image.image.path, 640)),
+        )
+
+    def test_listing_and_detail_expose_srcset(self):
+        ProductImage.objects.create(product=self.product, image=png(size=(800, 600)))
+        process_pending()
+
+        listed = self.client.get('/api/products/').data['results'][0]['main_image_sources']
+        self.assertEqual(listed['type'], 'image/webp')
+        # The 1024 file holds the 800px original and is listed at its real width
+        self.assertEqual([v['width'] for v in listed['variants']], [320, 640, 800])
+        self.assertTrue(listed['srcset'].endswith('-1024.webp 800w'))
+        self.assertTrue(listed['placeholder'].startswith('data:image/webp;base64,'))
+
+        detail = self.client.get(f'/api/products/{self.product.slug}/').data
+        self.assertEqual(detail['main_image_sources'], listed)
+        self.assertEqual(detail['images'][0]['sources'], listed)
+
+    def test_legacy_field_manifest_is_keyed_by_field(self):
+        self.product.image_2 = png('lado.png', size=ORIGINAL_SIZE)
+        self.product.save()
+        process_pending()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants['image_2']['src'], self.product.image_2.name)
+
+        detail = self.client.get(f'/api/products/{self.product.slug}/').data
+        self.assertEqual(list(detail['image_sources']), ['image_2'])
+        self.assertIsNone(detail['main_image_sources'])
+
+    def test_image_without_variants_has_no_sources(self):
+        ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        listed = self.client.get('/api/products/').data['results'][0]
+        self.assertIsNotNone(listed['main_image_url'])
+        self.assertIsNone(listed['main_image_sources'])
+
+    def test_full_save_of_stale_instance_keeps_manifest(self):
+        image = ProductImage.objects.create(product=self.product, image=png(size=ORIGINAL_SIZE))
+        process_pending()
+        image.alt_text = 'Vaso azul'
+        image.save()
+        image.refresh_from_db()
+        self.assertEqual(image.variants['src'], image.image.name)
+
+    def test_review_photos_get_thumbnails(self):
+        author = User.objects.create_user(username='autor', password='pass')
+        review = Review.objects.create(product=self.product, user=author, rating=5, comment='Lindo', status='approved')
+        photo = ReviewImage.objects.create(review=review, image=png('foto.png', size=(1600, 1200)))
+        self.assertEqual(process_pending(), 1)
+        self.assertTrue(all(
+            os.path.exists(_variant_path(photo.image.path, width)) for width in REVIEW_TARGET_WIDTHS
+        ))
+
+        detail = self.client.get(f'/api/products/{self.product.slug}/').data
+        thumbnails = detail['reviews'][0]['image_thumbnails']
+        self.assertEqual(len(thumbnails), 1)
+        self.assertTrue(thumbnails[0]['thumbnail'].endswith('-160.webp'))
+        self.assertTrue(thumbnails[0]['full'].endswith('-1280.webp'))
+        self.assertEqual([v['width'] for v in thumbnails[0]['variants']], REVIEW_TARGET_WIDTHS)
+
+    def test_review_photo_urls_never_expose_the_original(self):
+        author = User.objects.create_user(username='autor', password='pass')
+        review = Review.objects.create(product=self.product, user=author, rating=5, comment='Lindo', status='approved')
+        exif = Image.Exif()
+        exif[0x010F] = 'Telemovel'
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), (10, 120, 30)).save(buffer, format='JPEG', exif=exif)
+        ReviewImage.objects.create(
+            review=review, image=SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+        detail_url = f'/api/products/{self.product.slug}/'
+
+        # Before the worker runs: an on-demand rendition, re-encoded without EXIF
+        url = self.client.get(detail_url).data['reviews'][0]['images'][0]
+        self.assertIn('/images/resize/', url)
+        with self.settings(IMAGE_RESIZE_CACHE_DIR=os.path.join(self.media_root, '.resized')):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(dict(img.getexif()), {})
+            self.assertLessEqual(img.width, REVIEW_TARGET_WIDTHS[-1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending()
+        url = self.client.get(detail_url).data['reviews'][0]['images'][0]
+        self.assertTrue(url.endswith(f'-{REVIEW_TARGET_WIDTHS[-1]}.webp'))
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from products import image_resize
+from products.image_resize import evict, get_resized, maybe_evict, resize_url, sign_source
+
+from .media import TempMediaRootMixin
+
+
+class ImageResizeTests(TempMediaRootMixin, SimpleTestCase):
+    def media_settings(self):
+        self.cache_dir = os.path.join(self.media_root, '.resized')
+        return {'IMAGE_RESIZE_CACHE_DIR': self.cache_dir, 'IMAGE_RESIZE_WIDTHS': [480, 1440]}
+
+    def setUp(self):
+        super().setUp()
+        self.name = 'products/1/foto.jpg'
+        os.makedirs(os.path.join(self.media_root, 'products/1'))
+        Image.new('RGB', (1200, 900), (90, 60, 30)).save(os.path.join(self.media_root, self.name), format='JPEG')
+
+    def test_signed_url_serves_webp_at_requested_width(self):
+        res = self.client.get(resize_url(self.name, 480))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('immutable', res['Cache-Control'])
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (480, 360)))
+
+    def test_never_upscales(self):
+        path = get_resized(self.name, 1440, sign_source(self.name))
+        with Image.open(path) as img:
+            self.assertEqual(img.width, 1200)
+
+    def test_rejects_bad_signature_width_and_paths(self):
+        self.assertEqual(self.client.get(resize_url(self.name, 500)).status_code, 400)
+        forged = resize_url(self.name, 480).replace(sign_source(self.name), 'forged')
+        self.assertEqual(self.client.get(forged).status_code, 400)
+        self.assertEqual(self.client.get(resize_url('products/../../etc/passwd', 480)).status_code, 400)
+        self.assertEqual(self.client.get(resize_url('products/1/missing.jpg', 480)).status_code, 404)
+
+    def test_concurrent_misses_resize_once(self):
+        calls = []
+        real_resize = image_resize._resize
+
+        def slow_resize(*args):
+            calls.append(args)
+            time.sleep(0.2)
+            real_resize(*args)
+
+        paths = []
+        with mock.patch.object(image_resize, '_resize', slow_resize):
+            threads = [
+                threading.Thread(target=lambda: paths.append(get_resized(self.name, 480, sign_source(self.name))))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(paths)), 1)
+        self.assertTrue(os.path.exists(paths[0]))
+
+    def test_evicts_least_recently_used_renditions(self):
+        signature = sign_source(self.name)
+        older = get_resized(self.name, 480, signature)
+        newer = get_resized(self.name, 1440, signature)
+        os.utime(older, (time.time() - 60, time.time() - 60))
+        # A hit refreshes recency
+        get_resized(self.name, 480, signature)
+        os.utime(newer, (time.time() - 120, time.time() - 120))
+        evict(budget=os.path.getsize(older) * 3 // 2)
+        self.assertTrue(os.path.exists(older))
+        self.assertFalse(os.path.exists(newer))
+
+    def test_misses_evict_at_most_once_per_interval(self):
+        signature = sign_source(self.name)
+        with mock.patch.object(image_resize, 'evict', return_value=0) as evict_mock:
+            get_resized(self.name, 480, signature)
+            get_resized(self.name, 1440, signature)
+            self.assertEqual(evict_mock.call_count, 1)
+            marker = os.path.join(self.cache_dir, image_resize.EVICT_MARKER)
+            os.utime(marker, (time.time() - 600, time.time() - 600))
+            maybe_evict(interval=300)
+            self.assertEqual(evict_mock.call_count, 2)
+
+    def test_lock_files_are_kept(self):
+        path = get_resized(self.name, 480, sign_source(self.name))
+        self.assertTrue(os.path.exists(f'{path}.lock'))
+
+    def test_eviction_deletes_free_lock_files_of_evicted_renditions(self):
+        signature = sign_source(self.name)
+        evicted = get_resized(self.name, 480, signature)
+        busy = get_resized(self.name, 1440, signature)
+        with image_resize._lock_rendition(busy):
+            evict(budget=0)
+            self.assertFalse(os.path.exists(evicted))
+            self.assertFalse(os.path.exists(f'{evicted}.lock'))
+            # Held by a request, so it stays
+            self.assertTrue(os.path.exists(f'{busy}.lock'))
+        evict(budget=0)
+        self.assertFalse(os.path.exists(f'{busy}.lock'))
+
+    def test_waiter_on_a_deleted_lock_file_locks_the_current_one(self):
+        target = os.path.join(self.cache_dir, 'ab', 'ab.webp')
+        os.makedirs(os.path.dirname(target))
+        got = []
+        with image_resize._lock_rendition(target):
+            waiter = threading.Thread(target=lambda: got.append(image_resize._lock_rendition(target)))
+            waiter.start()
+            time.sleep(0.1)
+            os.remove(f'{target}.lock')
+        waiter.join()
+        with got[0] as lock:
+            self.assertEqual(os.fstat(lock.fileno()).st_ino, os.stat(f'{target}.lock').st_ino)
+
+    def test_rendition_evicted_before_open_is_rendered_again(self):
+        real_get_resized = image_resize.get_resized
+
+        def evicted(*args):
+            path = real_get_resized(*args)
+            if evicted.first:
+                evicted.first = False
+                os.remove(path)
+            return path
+        evicted.first = True
+
+        with mock.patch('products.views.get_resized', evicted):
+            res = self.client.get(resize_url(self.name, 480))
+        self.assertEqual(res.status_code, 200)
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.size, (480, 360))
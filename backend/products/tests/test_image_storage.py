@@ -0,0 +1,80 @@
+import os
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from customers.models import ExternalAuthUser
+from products.image_jobs import process_pending
+from products.models import Category, ImageBlob, ImageVariantJob, Product, ProductImage
+
+from .media import TempMediaRootMixin, png
+
+
+class ContentAddressedStorageTests(TempMediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+
+    def _files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, filename), self.media_root)
+            for dirpath, _, filenames in os.walk(self.media_root)
+            for filename in filenames
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first = ProductImage.objects.create(product=self.product, image=png('a.png'))
+        second = ProductImage.objects.create(product=self.product, image=png('b.PNG'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(self._files(), [first.image.name])
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).ref_count, 2)
+
+        other = ProductImage.objects.create(product=self.product, image=png(color=(0, 0, 255)))
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_refs_follow_replacements_and_deletes(self):
+        self.product.main_image = png('a.png')
+        self.product.save()
+        old_name = self.product.main_image.name
+        self.product.main_image = png('b.png', color=(0, 255, 0))
+        self.product.save()
+        self.assertEqual(ImageBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(ImageBlob.objects.get(name=self.product.main_image.name).ref_count, 1)
+
+        image = ProductImage.objects.create(product=self.product, image=png('c.png', color=(0, 255, 0)))
+        image.delete()
+        self.assertEqual(ImageBlob.objects.get(name=self.product.main_image.name).ref_count, 1)
+
+    def test_reupload_of_processed_file_reuses_variants(self):
+        first = ProductImage.objects.create(product=self.product, image=png())
+        process_pending()
+        files = self._files()
+        again = ProductImage.objects.create(product=self.product, image=png('de-novo.png'))
+        again.refresh_from_db()
+        self.assertEqual(again.variants['src'], again.image.name)
+        self.assertEqual(self._files(), files)
+        self.assertEqual(ImageVariantJob.objects.get(image=first.image.name).status, ImageVariantJob.STATUS_DONE)
+
+    def test_duplicate_product_shares_files_and_manifests(self):
+        admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=admin, is_admin=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        self.product.image_2 = png('lado.png', color=(9, 9, 9))
+        self.product.save()
+        ProductImage.objects.create(product=self.product, image=png())
+        process_pending()
+        files = self._files()
+
+        res = client.post(f'/api/products/id/{self.product.id}/duplicate/')
+        self.assertEqual(res.status_code, 201)
+        copy = Product.objects.get(pk=res.data['id'])
+        self.assertEqual(copy.image_2.name, self.product.image_2.name)
+        self.assertEqual(copy.image_variants['image_2']['src'], copy.image_2.name)
+        self.assertEqual(copy.images.get().variants['src'], copy.images.get().image.name)
+        self.assertEqual(self._files(), files)
+        self.assertEqual(ImageBlob.objects.get(name=copy.image_2.name).ref_count, 2)
+        self.assertFalse(ImageVariantJob.objects.exclude(status=ImageVariantJob.STATUS_DONE).exists())
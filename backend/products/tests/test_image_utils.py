@@ -0,0 +1,82 @@
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from products.image_utils import REVIEW_TARGET_WIDTHS, TARGET_WIDTHS, _variant_path, generate_webp_variants
+
+
+class WebpVariantPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def _photo(self, size=(4000, 3000), fmt='JPEG', mode='RGB'):
+        path = os.path.join(self.tmp, f'foto.{fmt.lower()}')
+        Image.effect_noise(size, 40).convert(mode).save(path, format=fmt)
+        return path
+
+    def _sizes(self, path):
+        sizes = {}
+        for width in TARGET_WIDTHS:
+            with Image.open(_variant_path(path, width)) as variant:
+                sizes[width] = variant.size
+        return sizes
+
+    def test_draft_decoded_jpeg_yields_exact_widths(self):
+        path = self._photo()
+        generate_webp_variants(path)
+        self.assertEqual(self._sizes(path), {320: (320, 240), 640: (640, 480), 1024: (1024, 768)})
+
+    def test_small_images_are_not_upscaled(self):
+        path = self._photo(size=(500, 250), fmt='PNG', mode='RGBA')
+        generate_webp_variants(path)
+        self.assertEqual(self._sizes(path), {320: (320, 160), 640: (500, 250), 1024: (500, 250)})
+
+    def test_only_stale_widths_are_rewritten(self):
+        path = self._photo()
+        generate_webp_variants(path)
+        os.remove(_variant_path(path, 320))
+        mtime_1024 = os.path.getmtime(_variant_path(path, 1024))
+        generate_webp_variants(path)
+        self.assertTrue(os.path.exists(_variant_path(path, 320)))
+        self.assertEqual(os.path.getmtime(_variant_path(path, 1024)), mtime_1024)
+
+    def test_encoder_settings_are_configurable_per_width(self):
+        path = self._photo()
+        generate_webp_variants(path)
+        default_size = os.path.getsize(_variant_path(path, 640))
+        for width in TARGET_WIDTHS:
+            os.remove(_variant_path(path, width))
+        with override_settings(IMAGE_VARIANT_ENCODING={640: {'quality': 10}}):
+            generate_webp_variants(path)
+        self.assertLess(os.path.getsize(_variant_path(path, 640)), default_size / 2)
+
+    def test_review_widths_apply_orientation_and_strip_metadata(self):
+        path = os.path.join(self.tmp, 'telefone.jpg')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # stored landscape, displayed portrait
+        exif[0x010F] = 'Fabricante'
+        Image.effect_noise((2000, 1500), 40).convert('RGB').save(path, format='JPEG', exif=exif)
+
+        manifest = generate_webp_variants(path, widths=REVIEW_TARGET_WIDTHS)
+        self.assertEqual((manifest['width'], manifest['height']), (1500, 2000))
+        with Image.open(_variant_path(path, 1280)) as variant:
+            self.assertEqual(variant.size, (1280, 1706))
+            self.assertNotIn('exif', variant.info)
+        self.assertEqual([v['target'] for v in manifest['variants']], REVIEW_TARGET_WIDTHS)
+
+    def test_manifest_carries_a_tiny_placeholder(self):
+        path = self._photo(size=(800, 400))
+        manifest = generate_webp_variants(path)
+        prefix = 'data:image/webp;base64,'
+        self.assertTrue(manifest['placeholder'].startswith(prefix))
+        self.assertLess(len(manifest['placeholder']), 1024)
+        with Image.open(BytesIO(base64.b64decode(manifest['placeholder'][len(prefix):]))) as tiny:
+            self.assertEqual(tiny.size, (20, 10))
+        # Up-to-date variants still describe the same placeholder
+        self.assertEqual(generate_webp_variants(path)['placeholder'], manifest['placeholder'])
@@ -0,0 +1,80 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from products.models import Category, Product
+
+
+class ProductCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Calçados')
+        # Few distinct prices so the id tie-breaker is exercised
+        for i in range(12):
+            Product.objects.create(
+                name=f'Sapato {i}', description='x', category=category,
+                price=f'{(i % 3 + 1) * 10}.00', stock_quantity=1,
+            )
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            data = res.json()
+            self.assertNotIn('count', data)
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids
+
+    def test_default_ordering_walks_all_products_once(self):
+        ids = self._walk('/api/products/?pagination=cursor&page_size=5')
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_ordering_with_ties(self):
+        ids = self._walk('/api/products/?pagination=cursor&page_size=4&ordering=price')
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/products/?pagination=cursor&page_size=5&ordering=-price').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([r['id'] for r in back['results']], [r['id'] for r in first['results']])
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/products/?pagination=cursor')
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_cursor_filter_is_one_row_comparison(self):
+        # Postgres only bounds the (price, id) index scan with this form
+        first = self.client.get('/api/products/?pagination=cursor&page_size=4&ordering=price').json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first['next'])
+        page_sql = next(q['sql'] for q in ctx.captured_queries if 'ORDER BY' in q['sql'])
+        self.assertIn('("products_product"."price", "products_product"."id") > (', page_sql)
+        self.assertNotIn(' OR ', page_sql)
+
+    def test_every_ordering_walks_all_products_once(self):
+        for field in ('name', 'stock_quantity', 'view_count', 'sales_count'):
+            ids = self._walk(f'/api/products/?pagination=cursor&page_size=5&ordering=-{field}')
+            expected = list(Product.objects.order_by(f'-{field}', '-id').values_list('id', flat=True))
+            self.assertEqual(ids, expected, field)
+
+    def test_invalid_cursor(self):
+        res = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(res.status_code, 404)
+        # A well-formed cursor whose value doesn't fit the ordering field
+        first = self.client.get('/api/products/?pagination=cursor&page_size=4').json()
+        cursor = b64decode(parse.parse_qs(parse.urlsplit(first['next']).query)['cursor'][0]).decode()
+        bad = b64encode(cursor.replace('v=', 'v=x', 1).encode()).decode()
+        self.assertEqual(self.client.get(f'/api/products/?cursor={parse.quote(bad)}').status_code, 404)
+
+    def test_page_number_remains_default(self):
+        data = self.client.get('/api/products/').json()
+        self.assertEqual(data['count'], 12)
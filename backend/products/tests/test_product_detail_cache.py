@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from cart.models import Order, OrderItem
+from products.models import CatalogVersion, Category, Product, ProductImage, Review, ReviewHelpfulVote
+
+
+class ProductDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Acessórios')
+        self.product = Product.objects.create(
+            name='Relógio', description='x', category=self.category, price='300.00', stock_quantity=2,
+        )
+        self.user = User.objects.create_user(username='cliente', password='pass')
+        self.review = Review.objects.create(product=self.product, user=self.user, rating=4, status='approved')
+        self.url = f'/api/products/{self.product.slug}/'
+
+    def test_cached_hit_skips_serialization(self):
+        self.client.get(self.url)
+        # catalog and detail versions + the queued view
+        with self.assertNumQueries(2):
+            res = self.client.get(self.url)
+        self.assertEqual(res.json()['id'], self.product.id)
+
+    def test_unknown_slugs_write_nothing(self):
+        versions = CatalogVersion.objects.count()
+        for i in range(5):
+            self.assertEqual(self.client.get(f'/api/products/nao-existe-{i}/').status_code, 404)
+        self.assertEqual(CatalogVersion.objects.count(), versions)
+
+    def test_review_change_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=5, status='approved')
+        res = self.client.get(self.url)
+        self.assertEqual(len(res.json()['reviews']), 2)
+
+    def test_order_status_change_refreshes_verified_buyer(self):
+        self.assertFalse(self.client.get(self.url).json()['reviews'][0]['verified_buyer'])
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=self.user, status='pending')
+            OrderItem.objects.create(order=order, product=self.product, product_name=self.product.name)
+        self.assertFalse(self.client.get(self.url).json()['reviews'][0]['verified_buyer'])
+
+        order.status = 'paid'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertTrue(self.client.get(self.url).json()['reviews'][0]['verified_buyer'])
+        order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertFalse(self.client.get(self.url).json()['reviews'][0]['verified_buyer'])
+
+    def test_image_change_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.product, image='products/x/main.jpg', is_main=True)
+        res = self.client.get(self.url)
+        self.assertEqual(len(res.json()['images']), 1)
+
+    def test_slug_change_drops_old_entry(self):
+        old_url = self.url
+        self.client.get(old_url)
+        self.product.slug = 'relogio-novo'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+
+    def test_inactive_product_is_hidden_after_status_change(self):
+        self.client.get(self.url)
+        self.product.status = 'inactive'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_helpful_flag_overlaid_per_user(self):
+        voter = User.objects.create_user(username='votante', password='pass')
+        ReviewHelpfulVote.objects.create(review=self.review, user=voter)
+        # Warm the cache anonymously
+        anon = self.client.get(self.url).json()
+        self.assertFalse(anon['reviews'][0]['user_has_voted_helpful'])
+
+        self.client.force_authenticate(user=voter)
+        res = self.client.get(self.url).json()
+        self.assertTrue(res['reviews'][0]['user_has_voted_helpful'])
+
+        self.client.force_authenticate(user=None)
+        res = self.client.get(self.url).json()
+        self.assertFalse(res['reviews'][0]['user_has_voted_helpful'])
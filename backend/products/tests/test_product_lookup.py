@@ -0,0 +1,46 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product
+
+
+class ProductLookupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Roupa')
+        self.shirt = Product.objects.create(
+            name='Camisa Polo', description='x', brand='Lacoste', sku='LAC-POLO-01', category=category, price='90.00',
+        )
+        self.variant = Product.objects.create(
+            name='Camisa Polo Slim', description='x', brand='Lacoste', sku='LAC-POLO-011', category=category, price='95.00',
+        )
+        self.sneaker = Product.objects.create(
+            name='Sapatilha Runner', description='Sola amortecida para corrida', brand='Adidas', sku='ADI-RUN-7', category=category, price='120.00',
+        )
+
+    def _search(self, **params):
+        res = self.client.get('/api/products/', params)
+        self.assertEqual(res.status_code, 200)
+        return [p['id'] for p in res.data['results']]
+
+    def test_exact_sku_returns_only_that_product(self):
+        self.assertEqual(self._search(search='LAC-POLO-01'), [self.shirt.id])
+        self.assertEqual(self._search(search='lac-polo-01'), [self.shirt.id])
+
+    def test_substring_search_still_matches(self):
+        self.assertEqual(set(self._search(search='polo')), {self.shirt.id, self.variant.id})
+        self.assertEqual(self._search(search='adidas'), [self.sneaker.id])
+        self.assertEqual(self._search(search='amortecida'), [self.sneaker.id])
+
+    def test_fuzzy_mode_tolerates_typos_and_ranks_by_similarity(self):
+        self.assertEqual(self._search(search='addidas', search_mode='fuzzy'), [self.sneaker.id])
+        self.assertEqual(self._search(search='addidas'), [])
+        results = self._search(search='camisa polo slimm', search_mode='fuzzy')
+        self.assertEqual(results[0], self.variant.id)
+
+    def test_fuzzy_search_keeps_its_ranking_when_cursor_pages_are_asked_for(self):
+        res = self.client.get('/api/products/', {
+            'search': 'camisa polo slimm', 'search_mode': 'fuzzy', 'pagination': 'cursor',
+        })
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('count', res.data)
+        self.assertEqual(res.data['results'][0]['id'], self.variant.id)
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from customers.models import ExternalAuthUser
+from products.models import Category, Product, Review
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=self.admin, is_admin=True)
+        self.author = User.objects.create_user(username='autor', password='pass')
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Caneca', description='x', category=category, price='20.00')
+
+    def _review(self, rating, status='pending'):
+        return Review.objects.create(product=self.product, user=self.author, rating=rating, status=status)
+
+    def _moderate(self, review, action):
+        self.client.force_authenticate(user=self.admin)
+        res = self.client.post(f'/api/products/reviews/{review.id}/moderate/', {'action': action}, format='json')
+        self.assertEqual(res.status_code, 200)
+
+    def _assert_aggregates(self, rating_sum, rating_count):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (rating_sum, rating_count))
+
+    def test_moderation_updates_aggregates(self):
+        first, second = self._review(5), self._review(2)
+        self._assert_aggregates(0, 0)
+        self._moderate(first, 'approve')
+        self._moderate(second, 'approve')
+        self._assert_aggregates(7, 2)
+        self.assertEqual(self.product.average_rating, 3.5)
+        self.assertEqual(self.product.total_reviews, 2)
+        self._moderate(second, 'reject')
+        self._assert_aggregates(5, 1)
+        # Approving twice must not double count
+        self._moderate(first, 'approve')
+        self._assert_aggregates(5, 1)
+
+    def test_delete_updates_aggregates(self):
+        review = self._review(4, status='approved')
+        self._assert_aggregates(4, 1)
+        review.delete()
+        self._assert_aggregates(0, 0)
+
+    def test_stale_product_save_keeps_aggregates(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self._review(3, status='approved')
+        Product.objects.filter(pk=self.product.pk).update(sales_count=F('sales_count') + 2)
+        stale.name = 'Caneca Grande'
+        stale.save()
+        self._assert_aggregates(3, 1)
+        self.assertEqual(self.product.sales_count, 2)
+
+    def test_rebuild_command(self):
+        self._review(4, status='approved')
+        self._review(2, status='approved')
+        self._review(1, status='rejected')
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=0, rating_count=0)
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self._assert_aggregates(6, 2)
+
+
+class ConcurrentModerationTests(TransactionTestCase):
+    """Moderations run on request threads with their own connections, so they need real commits."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=self.admin, is_admin=True)
+        author = User.objects.create_user(username='autor', password='pass')
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Caneca', description='x', category=category, price='20.00')
+        self.review = Review.objects.create(product=self.product, user=author, rating=4, status='pending')
+
+    def _moderate(self, action):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        try:
+            return client.post(f'/api/products/reviews/{self.review.id}/moderate/', {'action': action}, format='json')
+        finally:
+            connections.close_all()
+
+    def test_concurrent_approvals_count_the_review_once(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(self._moderate, ['approve'] * 12))
+        self.assertTrue(all(res.status_code == 200 for res in responses))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_count), (4, 1))
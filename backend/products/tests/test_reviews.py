@@ -0,0 +1,272 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from cart.models import Order, OrderItem
+from customers.models import ExternalAuthUser
+from products.models import Category, Product, Review, ReviewHelpfulVote
+
+
+class ReviewListFlagTests(TestCase):
+    """verified_buyer and user_has_voted_helpful cost two queries per page, not per review."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+        self.viewer = User.objects.create_user(username='leitor', password='pass')
+        self.client.force_authenticate(user=self.viewer)
+
+    def _create_reviews(self, count):
+        start = Review.objects.count()
+        reviews = []
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'autor{i}', password='pass')
+            reviews.append(Review.objects.create(
+                product=self.product, user=author, rating=5, comment='Bom', status='approved',
+            ))
+        return reviews
+
+    def _buy(self, user, status='paid'):
+        order = Order.objects.create(user=user, status=status)
+        OrderItem.objects.create(order=order, product=self.product, product_name=self.product.name)
+
+    def _get(self, url, expected):
+        with self.assertNumQueries(expected):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_product_reviews_page_resolves_flags_in_bulk(self):
+        url = f'/api/products/{self.product.id}/reviews/'
+        # summary + count + page + images + verified + votes
+        self._create_reviews(2)
+        self._get(url, 6)
+        bought, voted, *_ = self._create_reviews(4)
+        self._buy(bought.user)
+        self._buy(voted.user, status='cancelled')
+        ReviewHelpfulVote.objects.create(review=voted, user=self.viewer)
+
+        results = {r['id']: r for r in self._get(url, 6)['results']}
+        self.assertEqual(len(results), 6)
+        self.assertTrue(results[bought.id]['verified_buyer'])
+        self.assertFalse(results[voted.id]['verified_buyer'])
+        self.assertTrue(results[voted.id]['user_has_voted_helpful'])
+        self.assertEqual(sum(r['verified_buyer'] for r in results.values()), 1)
+        self.assertEqual(sum(r['user_has_voted_helpful'] for r in results.values()), 1)
+
+    def test_admin_list_resolves_flags_in_bulk(self):
+        admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=admin, is_admin=True)
+        self.client.force_authenticate(user=admin)
+        reviews = self._create_reviews(3)
+        self._buy(reviews[0].user)
+        # admin check (3) + page + images + verified + votes + count
+        data = self._get('/api/products/reviews/', 8)
+        self.assertEqual([r['verified_buyer'] for r in data['results']], [False, False, True])
+        self._create_reviews(3)
+        self._get('/api/products/reviews/', 8)
+
+    def test_single_review_still_resolves_its_flags(self):
+        review = self._create_reviews(1)[0]
+        self._buy(review.user, status='delivered')
+        self.client.force_authenticate(user=review.user)
+        res = self.client.get(f'/api/reviews/{review.id}/')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data['verified_buyer'])
+        self.assertFalse(res.data['user_has_voted_helpful'])
+
+
+class ReviewSummaryAndCursorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+        self.url = f'/api/products/{self.product.id}/reviews/'
+        self.reviews = []
+        for i, (rating, helpful) in enumerate([(5, 3), (4, 0), (5, 7), (2, 3), (1, 0)]):
+            author = User.objects.create_user(username=f'autor{i}', password='pass')
+            self.reviews.append(Review.objects.create(
+                product=self.product, user=author, rating=rating, helpful_count=helpful, status='approved',
+            ))
+
+    def _walk(self, sort_by):
+        ids = []
+        url = f'{self.url}?pagination=cursor&page_size=2&sort_by={sort_by}'
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            ids.extend(r['id'] for r in data['results'])
+            url = data['next']
+        return ids
+
+    def test_summary_is_cached_until_moderation(self):
+        meta = self.client.get(self.url).json()['meta']
+        self.assertEqual(meta, {'counts': {'1': 1, '2': 1, '3': 0, '4': 1, '5': 2}, 'total': 5, 'average': 3.4})
+        # count + page + images + verified; the summary comes from the cache
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+        admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=admin, is_admin=True)
+        self.client.force_authenticate(user=admin)
+        res = self.client.post(
+            f'/api/products/reviews/{self.reviews[4].id}/moderate/', {'action': 'reject', 'notes': 'spam'},
+        )
+        self.assertEqual(res.status_code, 200)
+        meta = self.client.get(self.url).json()['meta']
+        self.assertEqual((meta['total'], meta['counts']['1'], meta['average']), (4, 0, 4.0))
+
+    def test_cursor_pages_follow_sort_by(self):
+        r = [review.id for review in self.reviews]
+        self.assertEqual(self._walk('recent'), r[::-1])
+        self.assertEqual(self._walk('highest'), [r[2], r[0], r[1], r[3], r[4]])
+        self.assertEqual(self._walk('lowest'), [r[4], r[3], r[1], r[0], r[2]])
+        self.assertEqual(self._walk('helpful'), [r[2], r[3], r[0], r[4], r[1]])
+
+
+class HelpfulToggleTests(TransactionTestCase):
+    """The toggle runs on request threads with their own connections, so it needs real commits."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+        author = User.objects.create_user(username='autor', password='pass')
+        self.review = Review.objects.create(product=self.product, user=author, rating=5, status='approved')
+        self.url = f'/api/reviews/{self.review.id}/helpful/'
+
+    def _toggle(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            return client.post(self.url)
+        finally:
+            connections.close_all()
+
+    def test_toggle_adds_then_removes_the_vote(self):
+        user = User.objects.create_user(username='leitor', password='pass')
+        res = self._toggle(user)
+        self.assertEqual(res.data, {'helpful_count': 1, 'user_has_voted_helpful': True})
+        res = self._toggle(user)
+        self.assertEqual(res.data, {'helpful_count': 0, 'user_has_voted_helpful': False})
+
+    def test_vote_refreshes_the_product_detail_but_not_the_catalog(self):
+        cache.clear()
+        client = APIClient()
+        detail_url = f'/api/products/{self.product.slug}/'
+        list_etag = client.get('/api/products/')['ETag']
+        detail_etag = client.get(detail_url)['ETag']
+        self._toggle(User.objects.create_user(username='leitor', password='pass'))
+
+        self.assertEqual(client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        res = client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['reviews'][0]['helpful_count'], 1)
+
+    def test_pending_review_cannot_be_voted(self):
+        Review.objects.filter(pk=self.review.pk).update(status='pending')
+        user = User.objects.create_user(username='leitor', password='pass')
+        self.assertEqual(self._toggle(user).status_code, 404)
+        self.assertFalse(ReviewHelpfulVote.objects.exists())
+
+    def _click(self, user, times):
+        return [self._toggle(user) for _ in range(times)]
+
+    def test_concurrent_toggles_keep_the_count_exact(self):
+        voters = [User.objects.create_user(username=f'leitor{i}', password='pass') for i in range(8)]
+        # Each user clicks serially while the users race each other; an odd
+        # number of clicks leaves a vote, so voters 0, 2, 4 and 6 end up voting
+        clicks = [i + 1 for i in range(len(voters))]
+        with ThreadPoolExecutor(max_workers=len(voters)) as pool:
+            responses = [res for batch in pool.map(self._click, voters, clicks) for res in batch]
+        self.assertTrue(all(res.status_code == 200 for res in responses))
+
+        self.review.refresh_from_db()
+        voted = set(ReviewHelpfulVote.objects.filter(review=self.review).values_list('user_id', flat=True))
+        self.assertEqual(voted, {voter.id for voter in voters[::2]})
+        self.assertEqual(self.review.helpful_count, 4)
+
+
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=self.admin, is_admin=True)
+        self.client.force_authenticate(user=self.admin)
+        category = Category.objects.create(name='Casa')
+        self.products = [
+            Product.objects.create(name=name, description='x', category=category, price='10.00')
+            for name in ('Vaso', 'Prato')
+        ]
+        self.author = User.objects.create_user(username='autor', password='pass')
+
+    def _reviews(self, product, ratings, status='pending'):
+        return [
+            Review.objects.create(product=product, user=self.author, rating=rating, status=status)
+            for rating in ratings
+        ]
+
+    def _moderate(self, ids, action, notes=''):
+        return self.client.post(
+            '/api/products/reviews/bulk-moderate/', {'ids': ids, 'action': action, 'notes': notes}, format='json',
+        )
+
+    def test_approves_in_one_update_and_rebuilds_each_product_once(self):
+        vase = self._reviews(self.products[0], [5, 4, 3])
+        plate = self._reviews(self.products[1], [2, 1])
+        summary_url = f'/api/products/{self.products[0].id}/reviews/'
+        self.assertEqual(self.client.get(summary_url).json()['meta']['total'], 0)
+
+        ids = [r.id for r in vase + plate]
+        # admin check (3) + savepoint, lock, update, rebuild, release
+        with self.assertNumQueries(8):
+            res = self._moderate(ids + [999999], 'approve')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, {'updated': 5, 'products': 2, 'missing': [999999]})
+
+        for product, (total, count) in zip(self.products, [(12, 3), (3, 2)]):
+            product.refresh_from_db()
+            self.assertEqual((product.rating_sum, product.rating_count), (total, count))
+        moderated = Review.objects.filter(pk__in=ids)
+        self.assertEqual(set(moderated.values_list('status', 'moderated_by', 'admin_seen')), {('approved', self.admin.id, True)})
+        self.assertEqual(self.client.get(summary_url).json()['meta']['total'], 3)
+
+    def test_reject_records_notes_and_drops_approved_ratings(self):
+        approved = self._reviews(self.products[0], [5, 1], status='approved')
+        res = self._moderate([approved[1].id], 'reject', notes='spam')
+        self.assertEqual(res.data['updated'], 1)
+        review = Review.objects.get(pk=approved[1].id)
+        self.assertEqual((review.status, review.moderation_notes), ('rejected', 'spam'))
+        self.products[0].refresh_from_db()
+        self.assertEqual((self.products[0].rating_sum, self.products[0].rating_count), (5, 1))
+
+    def test_admin_action_refreshes_the_review_summary(self):
+        reviews = self._reviews(self.products[0], [5, 4])
+        summary_url = f'/api/products/{self.products[0].id}/reviews/'
+        self.assertEqual(self.client.get(summary_url).json()['meta']['total'], 0)
+
+        superuser = User.objects.create_superuser(username='root', password='pass')
+        ExternalAuthUser.objects.create(firebase_uid='root', user=superuser, is_admin=True)
+        self.client.force_login(superuser)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/admin/products/review/', {
+                'action': 'approve_reviews', '_selected_action': [r.id for r in reviews],
+            })
+        self.assertEqual(res.status_code, 302)
+        self.products[0].refresh_from_db()
+        self.assertEqual((self.products[0].rating_sum, self.products[0].rating_count), (9, 2))
+        self.assertEqual(self.client.get(summary_url).json()['meta']['total'], 2)
+
+    def test_rejects_bad_input_and_non_admins(self):
+        self.assertEqual(self._moderate([1], 'delete').status_code, 400)
+        self.assertEqual(self._moderate([], 'approve').status_code, 400)
+        self.assertEqual(self._moderate(['x'], 'approve').status_code, 400)
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self._moderate([1], 'approve').status_code, 403)
@@ -0,0 +1,50 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Eletrônicos')
+        self.named = Product.objects.create(
+            name='Câmera Digital', description='Compacta', category=self.category, price='300.00',
+        )
+        self.described = Product.objects.create(
+            name='Tripé', description='Suporte ideal para câmera', category=self.category, price='50.00',
+        )
+        Product.objects.create(name='Caneca', description='Cerâmica', category=self.category, price='10.00')
+
+    def _search(self, params):
+        res = self.client.get('/api/products/search/', params)
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_accent_insensitive_and_ranked_by_field_weight(self):
+        results = self._search({'q': 'camera'})
+        self.assertEqual([p['id'] for p in results], [self.named.id, self.described.id])
+
+    def test_last_term_matches_as_prefix(self):
+        results = self._search({'q': 'digital cam'})
+        self.assertEqual([p['id'] for p in results], [self.named.id])
+
+    def test_category_name_is_searchable_and_kept_current(self):
+        self.assertEqual(len(self._search({'q': 'eletronicos'})), 3)
+        self.category.name = 'Fotografia'
+        self.category.save()
+        self.assertEqual(len(self._search({'q': 'fotografia'})), 3)
+        self.assertEqual(self._search({'q': 'eletronicos'}), [])
+
+    def test_edited_product_is_reindexed(self):
+        self.named.name = 'Filmadora'
+        self.named.save()
+        self.assertEqual([p['id'] for p in self._search({'q': 'filmadora'})], [self.named.id])
+
+    def test_page_param_returns_paginated_envelope(self):
+        data = self._search({'q': 'camera', 'page': 1, 'page_size': 1})
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([p['id'] for p in data['results']], [self.named.id])
+        self.assertIsNotNone(data['next'])
+
+    def test_bare_list_is_capped_at_page_size(self):
+        self.assertEqual(len(self._search({'page_size': 2})), 2)
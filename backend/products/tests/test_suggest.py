@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product, Review
+from products.suggest import get_suggest_index, reset_suggest_index
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        reset_suggest_index()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Câmeras')
+        self.camera = Product.objects.create(
+            name='Câmera Digital', description='x', brand='Canon', category=self.category, price='300.00', sales_count=5,
+        )
+        self.bag = Product.objects.create(
+            name='Bolsa para Câmera', description='x', brand='Canon', category=self.category, price='40.00', sales_count=50,
+        )
+        Product.objects.create(
+            name='Câmera Antiga', description='x', category=self.category, price='10.00', status='inactive',
+        )
+
+    def _suggest(self, q, **params):
+        res = self.client.get('/api/products/suggest/', {'q': q, **params})
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_prefix_matches_are_accent_insensitive(self):
+        data = self._suggest('cam')
+        # Name prefix first, then the best seller; inactive products are left out
+        self.assertEqual([p['slug'] for p in data['products']], [self.camera.slug, self.bag.slug])
+        self.assertEqual(data['categories'], [{'id': self.category.id, 'name': 'Câmeras'}])
+        self.assertEqual(self._suggest('can')['brands'], ['Canon'])
+
+    def test_every_word_must_match(self):
+        data = self._suggest('bolsa cam', limit=1)
+        self.assertEqual([p['id'] for p in data['products']], [self.bag.id])
+        self.assertEqual(self._suggest('bolsa zoom')['products'], [])
+
+    def test_served_from_memory_until_catalog_changes(self):
+        self._suggest('cam')
+        # Only the version check
+        with self.assertNumQueries(1):
+            self._suggest('bol')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Camiseta', description='x', category=self.category, price='15.00')
+        names = [p['name'] for p in self._suggest('cami')['products']]
+        self.assertEqual(names, ['Camiseta'])
+
+    def test_only_indexed_fields_rebuild_the_index(self):
+        index = get_suggest_index()
+        author = User.objects.create_user(username='autor', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.camera, user=author, rating=5, status='approved')
+            self.camera.price = '280.00'
+            self.camera.save()
+        self.assertIs(get_suggest_index(), index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camera.name = 'Câmera Compacta'
+            self.camera.save()
+        self.assertIsNot(get_suggest_index(), index)
+        self.assertEqual(self._suggest('compacta')['products'][0]['id'], self.camera.id)
+
+    def test_single_character_returns_nothing(self):
+        self.assertEqual(self._suggest('c'), {'products': [], 'brands': [], 'categories': []})
@@ -0,0 +1,73 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from customers.models import ExternalAuthUser
+from products.models import Category, Product, ProductImage
+
+from .media import TempMediaRootMixin, jpeg
+
+
+class StreamingUploadTests(TempMediaRootMixin, TestCase):
+    def media_settings(self):
+        return {'MAX_IMAGE_SIZE': 64 * 1024}
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        ExternalAuthUser.objects.create(firebase_uid='admin', user=admin, is_admin=True)
+        self.client.force_authenticate(user=admin)
+        category = Category.objects.create(name='Casa')
+        self.product = Product.objects.create(name='Vaso', description='x', category=category, price='10.00')
+
+    def _upload(self, image):
+        return self.client.post('/api/images/', {'product': self.product.id, 'image': image}, format='multipart')
+
+    def test_valid_image_is_stored_from_its_temporary_file(self):
+        res = self._upload(jpeg())
+        self.assertEqual(res.status_code, 201)
+        image = ProductImage.objects.get()
+        self.assertTrue(os.path.exists(image.image.path))
+
+    def test_oversized_image_is_rejected_while_streaming(self):
+        res = self._upload(jpeg(size=(600, 600)))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('tamanho máximo', str(res.data))
+        self.assertFalse(ProductImage.objects.exists())
+
+    def test_disallowed_extension_is_rejected(self):
+        res = self._upload(SimpleUploadedFile('script.svg', b'<svg/>', content_type='image/svg+xml'))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('não permitido', str(res.data))
+
+    def test_content_must_match_extension(self):
+        res = self._upload(SimpleUploadedFile('foto.png', jpeg().read(), content_type='image/png'))
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('PNG', str(res.data))
+
+    def test_bulk_upload_reports_rejected_files_and_keeps_the_rest(self):
+        res = self.client.post('/api/images/bulk_upload/', {
+            'product_id': self.product.id,
+            'images': [
+                jpeg('um.jpg'),
+                SimpleUploadedFile('script.svg', b'<svg/>', content_type='image/svg+xml'),
+                jpeg('grande.jpg', size=(600, 600)),
+                jpeg('tres.jpg'),
+            ],
+            'alt_text_3': 'Terceira',
+        }, format='multipart')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data['total_uploaded'], 2)
+        self.assertEqual(
+            [(error['file_index'], error['filename']) for error in res.data['errors']],
+            [(1, 'script.svg'), (2, 'grande.jpg')],
+        )
+        self.assertIn('tamanho máximo', str(res.data['errors'][1]['errors']))
+        self.assertEqual(
+            list(ProductImage.objects.order_by('order').values_list('order', 'alt_text')),
+            [(1, ''), (4, 'Terceira')],
+        )
@@ -0,0 +1,55 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from products.models import Category, Product, ProductView
+from products.view_counter import flush_views, record_view
+
+
+class ProductViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Livros')
+        self.first = Product.objects.create(name='Romance', description='x', category=category, price='15.00')
+        self.second = Product.objects.create(name='Poesia', description='x', category=category, price='12.00')
+
+    def _view_counts(self):
+        return dict(Product.objects.values_list('slug', 'view_count'))
+
+    def test_views_are_queued_until_flush(self):
+        record_view(self.first.slug)
+        record_view(self.first.slug)
+        record_view(self.second.slug)
+        self.assertEqual(self._view_counts(), {self.first.slug: 0, self.second.slug: 0})
+        # savepoint, claim, update, delete, release
+        with self.assertNumQueries(5):
+            self.assertEqual(flush_views(), 3)
+        self.assertEqual(self._view_counts(), {self.first.slug: 2, self.second.slug: 1})
+        self.assertFalse(ProductView.objects.exists())
+        self.assertEqual(flush_views(), 0)
+
+    def test_batches_drain_in_order_and_unknown_slugs_are_dropped(self):
+        for slug in (self.first.slug, 'apagado', self.second.slug, self.second.slug):
+            record_view(slug)
+        self.assertEqual(flush_views(batch_size=2), 2)
+        self.assertEqual(self._view_counts(), {self.first.slug: 1, self.second.slug: 0})
+        self.assertEqual(flush_views(batch_size=2), 2)
+        self.assertEqual(self._view_counts(), {self.first.slug: 1, self.second.slug: 2})
+
+    def test_command_drains_everything_once(self):
+        for _ in range(5):
+            record_view(self.first.slug)
+        out = StringIO()
+        call_command('flush_product_views', '--once', '--batch', '2', stdout=out)
+        self.assertIn('5 visualizações', out.getvalue())
+        self.assertEqual(self._view_counts()[self.first.slug], 5)
+
+    def test_detail_view_records_views_and_revalidations(self):
+        client = APIClient()
+        url = f'/api/products/{self.first.slug}/'
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.get(url + '?preview=1')
+        flush_views()
+        self.assertEqual(self._view_counts()[self.first.slug], 2)
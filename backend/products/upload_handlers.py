@@ -0,0 +1,138 @@
+"""
+Streaming image uploads
+Every uploaded file is spooled to a temporary file on disk in 64 KiB
+chunks (never buffered whole in worker memory) and checked as it streams:
+the extension against ALLOWED_IMAGE_EXTENSIONS, the first bytes against the
+image signature of that extension, and the running size against
+MAX_IMAGE_SIZE. A rejected file is skipped: the rest of it is discarded
+unread, it is left out of request.FILES and the reason is recorded in
+``request.rejected_uploads``, so the other files of the request still
+arrive. ImageMultiPartParser turns rejections into a 400 unless the view
+reports them itself (``collects_rejected_uploads``, as bulk uploads do).
+Storage then moves the temporary file into place, so the image pipeline
+only ever sees file paths.
+"""
+
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import MultiPartParser
+
+# Leading bytes of each allowed format; WebP is a RIFF container
+IMAGE_SIGNATURES = {
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.gif': (b'GIF87a', b'GIF89a'),
+    '.webp': (b'RIFF',),
+}
+# Enough leading bytes to check any signature (RIFF....WEBP)
+HEADER_BYTES = 12
+
+
+def _format_size(size):
+    return f'{size / (1024 * 1024):.0f} MB'
+
+
+def rejected_uploads(request, field_name=None):
+    """Files the upload handler skipped, optionally for one form field.
+
+    Each entry is ``{'field', 'index', 'filename', 'error'}``; ``index`` is
+    the file's position among the field's files as the client sent them.
+    """
+    rejected = getattr(request, 'rejected_uploads', None) or []
+    if field_name is None:
+        return list(rejected)
+    return [entry for entry in rejected if entry['field'] == field_name]
+
+
+class StreamingImageUploadHandler(TemporaryFileUploadHandler):
+    """Spools uploads to disk and enforces the image upload limits per chunk."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.positions = Counter()
+        if request is not None:
+            request.rejected_uploads = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.position = self.positions[field_name]
+        self.positions[field_name] += 1
+        self.extension = os.path.splitext(file_name or '')[1].lower()
+        allowed = getattr(settings, 'ALLOWED_IMAGE_EXTENSIONS', list(IMAGE_SIGNATURES))
+        if self.extension not in allowed:
+            self._reject(f'Formato de imagem não permitido: {file_name}. Use {", ".join(allowed)}.')
+        self.max_size = getattr(settings, 'MAX_IMAGE_SIZE', 5 * 1024 * 1024)
+        # Browsers usually send no per-file length; when they do, fail fast
+        if content_length and content_length > self.max_size:
+            self._reject(f'{file_name} excede o tamanho máximo de {_format_size(self.max_size)}.')
+        self.received = 0
+        self.header = b''
+
+    def _record_rejection(self, message):
+        # Drop the partial temporary file now rather than at garbage collection
+        self.file.close()
+        if self.request is not None:
+            self.request.rejected_uploads.append({
+                'field': self.field_name,
+                'index': self.position,
+                'filename': self.file_name,
+                'error': message,
+            })
+
+    def _reject(self, message):
+        # The parser discards the rest of the file and moves on to the next part
+        self._record_rejection(message)
+        raise SkipFile(message)
+
+    def _header_error(self):
+        signatures = IMAGE_SIGNATURES.get(self.extension)
+        valid = not signatures or self.header.startswith(signatures)
+        if valid and self.extension == '.webp':
+            valid = self.header[8:12] == b'WEBP'
+        if not valid:
+            return f'{self.file_name} não é uma imagem {self.extension[1:].upper()} válida.'
+        return None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.header is not None:
+            self.header += raw_data[:HEADER_BYTES - len(self.header)]
+            if len(self.header) >= HEADER_BYTES:
+                error = self._header_error()
+                if error:
+                    self._reject(error)
+                self.header = None
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._reject(f'{self.file_name} excede o tamanho máximo de {_format_size(self.max_size)}.')
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        # Files shorter than HEADER_BYTES are only checked here, where
+        # SkipFile isn't caught; returning None leaves the file out instead
+        error = self._header_error() if self.header is not None else None
+        if error:
+            self._record_rejection(error)
+            return None
+        return super().file_complete(file_size)
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """MultiPartParser that answers a rejected image upload with a 400.
+
+    Views that report rejected files themselves set
+    ``collects_rejected_uploads`` and read them with rejected_uploads().
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        view = parser_context.get('view')
+        rejected = rejected_uploads(parser_context.get('request'))
+        if rejected and not getattr(view, 'collects_rejected_uploads', False):
+            raise ParseError(rejected[0]['error'])
+        return parsed
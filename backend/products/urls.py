@@ -33,6 +33,9 @@ urlpatterns = [
     path('products/stats/', views.product_stats, name='product-stats'),
     path('products/category/<int:category_id>/', views.products_by_category, name='products-by-category'),
     path('products/search/', views.search_products, name='search-products'),
+    path('products/suggest/', views.suggest_products, name='suggest-products'),
+    path('products/facets/', views.ProductFacetsView.as_view(), name='product-facets'),
+    path('products/images/resize/', views.image_resize, name='image-resize'),
     path('products/id/<int:pk>/duplicate/', views.duplicate_product, name='product-duplicate'),
     
     # Generic Products URLs (must come after specific endpoints)
@@ -43,6 +46,7 @@ urlpatterns = [
     # Admin review listing and moderation
     path('products/reviews/', views.review_admin_list, name='review-admin-list'),
     path('products/reviews/<int:pk>/moderate/', views.review_moderate, name='review-moderate'),
+    path('products/reviews/bulk-moderate/', views.review_bulk_moderate, name='review-bulk-moderate'),
 
     path('products/', views.ProductListCreateView.as_view(), name='product-list-create'),
     path('products/id/<int:pk>/', views.ProductByIdDetailView.as_view(), name='product-detail-by-id'),
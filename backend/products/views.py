@@ -1,16 +1,21 @@
 from rest_framework import generics, status, filters, serializers, permissions
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.parsers import FormParser, JSONParser
+from rest_framework.decorators import api_view, action, authentication_classes, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, F, Count, Avg, Sum, Value, IntegerField, Case, When
-from django.core.files.base import File
+from django.db.models import Q, F, Count, Avg, Sum, Value, IntegerField, Case, When, Prefetch
+from django.core.cache import cache
+from django.db import transaction
 import os
 from django.utils import timezone
 from django.conf import settings
-from .models import Product, Category, Color, Size, ProductImage, Subcategory, Favorite, Review, ReviewHelpfulVote
+from django.utils.decorators import method_decorator
+from django.http import FileResponse, Http404, HttpResponseBadRequest
+from django.views.decorators.http import require_GET
+from .models import Product, Category, Color, Size, ProductImage, Subcategory, Favorite, Review
 from .serializers import (
     ProductListSerializer,
     ProductDetailSerializer,
@@ -24,8 +29,29 @@ from .serializers import (
     FavoriteCreateSerializer,
     ReviewSerializer
 )
+from .catalog import (
+    catalog_queryset,
+    catalog_conditional,
+    product_detail_cache_key,
+    product_detail_conditional,
+    invalidate_product_detail,
+    overlay_review_flags,
+    PRODUCT_DETAIL_TIMEOUT,
+)
+from .facets import compute_facets, facets_cache_key, FACETS_TIMEOUT
+from .helpful_votes import toggle_helpful_vote
+from .moderation import moderate_reviews
+from .image_resize import InvalidResizeRequest, get_resized
+from .filters import ProductSearchFilter
+from .pagination import CursorOptInPaginationMixin, ReviewKeysetPagination, SearchPagination
+from .ratings import review_summary
+from .search import search_products_queryset
+from .upload_handlers import ImageMultiPartParser, rejected_uploads
+from .suggest import get_suggest_index, MIN_QUERY_LENGTH as SUGGEST_MIN_QUERY_LENGTH
+from .view_counter import record_view
 from customers.views import IsAdmin
 
+@method_decorator(catalog_conditional, name='get')
 class ColorListCreateView(generics.ListCreateAPIView):
     """
     List all colors or create a new color
@@ -56,6 +82,7 @@ class ColorDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [permissions.AllowAny()]
         return [IsAdmin()]
 
+@method_decorator(catalog_conditional, name='get')
 class SizeListCreateView(generics.ListCreateAPIView):
     """
     List all sizes or create a new size
@@ -86,6 +113,7 @@ class SizeDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [permissions.AllowAny()]
         return [IsAdmin()]
 
+@method_decorator(catalog_conditional, name='get')
 class CategoryListCreateView(generics.ListCreateAPIView):
     """
     List all categories or create a new category
@@ -115,6 +143,7 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [permissions.AllowAny()]
         return [IsAdmin()]
 
+@method_decorator(catalog_conditional, name='get')
 class SubcategoryListCreateView(generics.ListCreateAPIView):
     """
     List all subcategories or create a new subcategory
@@ -155,28 +184,21 @@ def subcategories_by_category(request, category_id):
     serializer = SubcategorySerializer(subs, many=True)
     return Response(serializer.data)
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListFilterMixin:
     """
-    List all products or create a new product
+    Product list filtering shared by the listing and its facet counts
+
+    Non-staff only see active products; ``min_price``/``max_price``,
+    ``in_stock`` and ``low_stock`` come on top of the filter backends.
     """
     queryset = Product.objects.select_related('category', 'subcategory').all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # ProductSearchFilter last so fuzzy ranking survives OrderingFilter
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     search_fields = ['name', 'description', 'brand', 'sku']
     filterset_fields = ['category', 'subcategory', 'status', 'is_featured', 'is_bestseller', 'is_on_sale']
     ordering_fields = ['name', 'price', 'created_at', 'stock_quantity', 'view_count', 'sales_count']
     ordering = ['-created_at']
-    
-    def get_serializer_class(self):
-        if self.request.method == 'POST':
-            return ProductCreateUpdateSerializer
-        return ProductListSerializer
 
-    def get_permissions(self):
-        # Allow public listing, require admin to create products
-        if self.request.method in permissions.SAFE_METHODS:
-            return [permissions.AllowAny()]
-        return [IsAdmin()]
-    
     def get_queryset(self):
         queryset = super().get_queryset()
         
@@ -207,6 +229,56 @@ class ProductListCreateView(generics.ListCreateAPIView):
         
         return queryset
 
+@method_decorator(catalog_conditional, name='get')
+class ProductListCreateView(CursorOptInPaginationMixin, ProductListFilterMixin, generics.ListCreateAPIView):
+    """
+    List all products or create a new product
+
+    Pass ``?pagination=cursor`` for keyset pagination (no count, stable deep pages).
+    ``?search=`` matches name/description/brand/SKU (trigram indexed); an exact
+    SKU returns just that product and ``?search_mode=fuzzy`` tolerates typos.
+    Fuzzy results are ranked by similarity, which keyset pages can't follow,
+    so they always use page-number pagination.
+    """
+
+    def use_cursor_pagination(self):
+        return super().use_cursor_pagination() and not ProductSearchFilter().is_ranked(self.request)
+    
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return ProductCreateUpdateSerializer
+        return ProductListSerializer
+
+    def get_permissions(self):
+        # Allow public listing, require admin to create products
+        if self.request.method in permissions.SAFE_METHODS:
+            return [permissions.AllowAny()]
+        return [IsAdmin()]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = catalog_queryset(queryset)
+        return queryset
+
+@method_decorator(catalog_conditional, name='get')
+class ProductFacetsView(ProductListFilterMixin, generics.GenericAPIView):
+    """
+    Facet counts (brands, subcategories, colors, sizes, price ranges) for
+    the products matching the same params as the product listing
+    """
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        key = facets_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            data = compute_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, FACETS_TIMEOUT)
+        return Response(data)
+
+@method_decorator(product_detail_conditional, name='get')
 class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a product
@@ -227,13 +299,23 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         return queryset
     
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        # Increment view count unless it's a preview request
+        # Serve the shared body from cache; only active products are cached
+        # so status filtering for non-admin users still holds on a hit.
+        cache_key = product_detail_cache_key(request, kwargs[self.lookup_field])
+        data = cache.get(cache_key)
+        if data is None:
+            instance = self.get_object()
+            data = self.get_serializer(instance).data
+            if instance.status == 'active':
+                cache.set(cache_key, data, PRODUCT_DETAIL_TIMEOUT)
+        return Response(overlay_review_flags(data, request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Count views (including 304 revalidations) unless it's a preview request
         is_preview = request.query_params.get('preview') in ['1', 'true', 'True']
-        if not is_preview:
-            instance.increment_view_count()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        if request.method == 'GET' and response.status_code in (200, 304) and not is_preview:
+            record_view(kwargs[self.lookup_field])
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_permissions(self):
         # Public retrieve, admin required for updates/deletes
@@ -293,35 +375,26 @@ def duplicate_product(request, pk: int):
     # Save first to obtain an ID (SKU/slug are auto-generated in save())
     new_product.save()
 
-    # Copy legacy image fields if present
+    # Point the copy at the same stored files: uploads are content-addressed,
+    # so sharing a name shares the file, its WebP variants and their manifest
     legacy_image_fields = ['main_image', 'image_2', 'image_3', 'image_4']
-    for field_name in legacy_image_fields:
-        orig_field = getattr(original, field_name)
-        if orig_field:
-            try:
-                # Use the original file's basename just for extension; upload_to will generate a new unique path
-                base_name = os.path.basename(orig_field.name)
-                with orig_field.open('rb') as f:
-                    getattr(new_product, field_name).save(base_name, File(f), save=True)
-            except Exception:
-                # If a single image fails to copy, skip it silently
-                pass
-
-    # Copy ProductImage records (and files)
+    copied_fields = [field_name for field_name in legacy_image_fields if getattr(original, field_name)]
+    if copied_fields:
+        for field_name in copied_fields:
+            setattr(new_product, field_name, getattr(original, field_name).name)
+        new_product.image_variants = original.image_variants
+        new_product.save(update_fields=copied_fields + ['image_variants'])
+
+    # Copy ProductImage records
     for img in original.images.all().order_by('order', 'created_at'):
-        try:
-            new_img = ProductImage(
-                product=new_product,
-                alt_text=img.alt_text,
-                is_main=img.is_main,
-                order=img.order,
-            )
-            base_name = os.path.basename(img.image.name)
-            with img.image.open('rb') as f:
-                new_img.image.save(base_name, File(f), save=True)
-        except Exception:
-            # Skip problematic images to avoid failing the whole duplication
-            continue
+        ProductImage.objects.create(
+            product=new_product,
+            image=img.image.name,
+            variants=img.variants,
+            alt_text=img.alt_text,
+            is_main=img.is_main,
+            order=img.order,
+        )
 
     # Copy colors (M2M)
     new_product.colors.set(original.colors.all())
@@ -331,7 +404,6 @@ def duplicate_product(request, pk: int):
 
 
 from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 
 @api_view(['GET'])
 @cache_page(60 * 5)  # Cache for 5 minutes
@@ -339,18 +411,9 @@ def featured_products(request):
     """
     Get featured products with caching (limited to 8 for homepage)
     """
-    products = Product.objects.filter(
+    products = catalog_queryset().filter(
         is_featured=True,
         status='active'
-    ).select_related(
-        'category',
-        'subcategory'
-    ).prefetch_related(
-        'colors'
-    ).only(
-        'id', 'name', 'slug', 'price', 'original_price',
-        'is_on_sale', 'stock_quantity', 'status', 'main_image',
-        'min_stock_level', 'category__name', 'subcategory__name'
     )[:8]
     
     serializer = ProductListSerializer(products, many=True, context={'request': request})
@@ -361,10 +424,10 @@ def bestseller_products(request):
     """
     Get bestseller products (limited to 8 for homepage)
     """
-    products = Product.objects.filter(
+    products = catalog_queryset().filter(
         is_bestseller=True,
         status='active'
-    ).select_related('category').order_by('-sales_count')[:8]
+    ).order_by('-sales_count')[:8]
     
     serializer = ProductListSerializer(products, many=True, context={'request': request})
     return Response(serializer.data)
@@ -374,10 +437,10 @@ def sale_products(request):
     """
     Get products on sale
     """
-    products = Product.objects.filter(
+    products = catalog_queryset().filter(
         is_on_sale=True, 
         status='active'
-    ).select_related('category').order_by('-created_at')[:8]
+    ).order_by('-created_at')[:8]
     
     serializer = ProductListSerializer(products, many=True, context={'request': request})
     return Response(serializer.data)
@@ -395,10 +458,10 @@ def products_by_category(request, category_id):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    products = Product.objects.filter(
+    products = catalog_queryset().filter(
         category=category, 
         status='active'
-    ).select_related('category')
+    )
     
     # Apply ordering
     ordering = request.query_params.get('ordering', '-created_at')
@@ -414,22 +477,18 @@ def products_by_category(request, category_id):
 def search_products(request):
     """
     Advanced product search
+
+    Matches against the indexed full-text document and orders by rank. Pass
+    ``page`` (and optionally ``page_size``) for the paginated envelope;
+    without it a bare list of at most one page is returned.
     """
     try:
-        query = request.query_params.get('q', '')
+        query = request.query_params.get('q', '').strip()
         category_id = request.query_params.get('category')
         min_price = request.query_params.get('min_price')
         max_price = request.query_params.get('max_price')
 
-        products = Product.objects.filter(status='active').select_related('category')
-
-        if query:
-            products = products.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(brand__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+        products = catalog_queryset().filter(status='active')
 
         if category_id:
             products = products.filter(category_id=category_id)
@@ -440,20 +499,22 @@ def search_products(request):
         if max_price:
             products = products.filter(price__lte=max_price)
 
-        # Order by relevance (products with query in name first) without raw SQL
         if query:
-            products = products.annotate(
-                name_match=Case(
-                    When(name__icontains=query, then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-            ).order_by('-name_match', '-created_at')
+            products = search_products_queryset(products, query)
         else:
             products = products.order_by('-created_at')
 
+        paginator = SearchPagination()
+        if 'page' in request.query_params:
+            page = paginator.paginate_queryset(products, request)
+            serializer = ProductListSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+
+        products = products[:paginator.get_page_size(request)]
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
+    except NotFound:
+        raise
     except Exception as e:
         # Fail safe: never 500 on search; provide a structured error
         return Response({
@@ -461,6 +522,53 @@ def search_products(request):
             'message': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def suggest_products(request):
+    """
+    Search box suggestions (ids, slugs and names only)
+
+    Answered from the in-memory prefix index in products.suggest; ``limit``
+    caps each group (default 8, max 20). Queries shorter than two characters
+    return empty groups.
+    """
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    if len(query) < SUGGEST_MIN_QUERY_LENGTH:
+        return Response({'products': [], 'brands': [], 'categories': []})
+    return Response(get_suggest_index().suggest(query, limit))
+
+@require_GET
+def image_resize(request):
+    """
+    WebP rendition of an uploaded image at a whitelisted width
+
+    ``src`` is the storage name, ``sig`` its signature (see
+    products.image_resize.resize_url) and ``w`` one of IMAGE_RESIZE_WIDTHS.
+    Renditions are generated on the first request and then served from the
+    disk cache; the URL never changes meaning, so responses are immutable.
+    """
+    name, signature = request.GET.get('src', ''), request.GET.get('sig', '')
+    try:
+        width = int(request.GET.get('w', ''))
+        path = get_resized(name, width, signature)
+        try:
+            fh = open(path, 'rb')
+        except FileNotFoundError:
+            # Evicted between the lookup and the open: render it again
+            fh = open(get_resized(name, width, signature), 'rb')
+    except (ValueError, InvalidResizeRequest) as e:
+        return HttpResponseBadRequest(str(e))
+    except FileNotFoundError:
+        raise Http404('Imagem não encontrada')
+    response = FileResponse(fh, content_type='image/webp')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @api_view(['GET'])
 @permission_classes([IsAdmin])
 def product_stats(request):
@@ -496,7 +604,9 @@ class ProductImageViewSet(ModelViewSet):
     ViewSet for managing product images
     """
     serializer_class = ProductImageSerializer
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [ImageMultiPartParser, FormParser]
+    # Only bulk_upload reports rejected files per file instead of failing
+    collects_rejected_uploads = False
     
     def get_queryset(self):
         """Filter images by product if product_id is provided"""
@@ -529,11 +639,18 @@ class ProductImageViewSet(ModelViewSet):
         else:
             raise serializers.ValidationError({'product': 'Product ID is required'})
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], collects_rejected_uploads=True)
     def bulk_upload(self, request):
         """
         Bulk upload multiple images for a product
         Expects: product_id and multiple image files
+
+        Files the upload handler rejected (format, size, content) are listed
+        in ``errors`` next to the ones the serializer rejected, under the
+        index the client sent them at.
+
+        Saving only queues the WebP variants; the process_image_jobs worker
+        decodes and resizes the batch in parallel across its process pool.
         """
         product_id = request.data.get('product_id')
         if not product_id:
@@ -556,13 +673,23 @@ class ProductImageViewSet(ModelViewSet):
         
         # Handle multiple files
         files = request.FILES.getlist('images')
-        if not files:
+        rejected = rejected_uploads(request, 'images')
+        if not files and not rejected:
             return Response(
                 {'error': 'No images provided'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        for entry in rejected:
+            errors.append({
+                'file_index': entry['index'],
+                'filename': entry['filename'],
+                'errors': {'image': [entry['error']]}
+            })
         
-        for index, image_file in enumerate(files):
+        # Received files keep the index they were sent at, skipping rejected ones
+        skipped = {entry['index'] for entry in rejected}
+        indexes = (index for index in range(len(files) + len(skipped)) if index not in skipped)
+        for index, image_file in zip(indexes, files):
             # Prepare data for each image
             image_data = {
                 'product': product.id,
@@ -583,6 +710,7 @@ class ProductImageViewSet(ModelViewSet):
                     'errors': serializer.errors
                 })
         
+        errors.sort(key=lambda error: error['file_index'])
         response_data = {
             'uploaded_images': uploaded_images,
             'total_uploaded': len(uploaded_images),
@@ -617,7 +745,9 @@ class FavoriteListCreateView(generics.ListCreateAPIView):
             print('[Favorites][DEBUG] No Authorization header')
 
         if getattr(self.request, 'user', None) and self.request.user.is_authenticated:
-            return Favorite.objects.filter(user=self.request.user).select_related('product')
+            return Favorite.objects.filter(user=self.request.user).prefetch_related(
+                Prefetch('product', queryset=catalog_queryset())
+            )
         return Favorite.objects.none()
     
     def create(self, request, *args, **kwargs):
@@ -801,17 +931,22 @@ def auth_token_payload(request):
     })
 
 
-class ReviewListCreateView(generics.ListCreateAPIView):
+class ReviewListCreateView(CursorOptInPaginationMixin, generics.ListCreateAPIView):
     """
     List approved reviews for a product or create a new review (pending approval)
+
+    Pass ``?pagination=cursor`` for keyset pages in ``sort_by`` order.
     """
     serializer_class = ReviewSerializer
+    cursor_pagination_class = ReviewKeysetPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (ImageMultiPartParser, FormParser, JSONParser)
     
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
-        queryset = Review.objects.filter(product_id=product_id).select_related('user').prefetch_related('images')
+        queryset = Review.objects.filter(product_id=product_id).select_related(
+            'user', 'product', 'moderated_by',
+        ).prefetch_related('images')
         # Optional rating filter
         rating = self.request.query_params.get('rating')
         if rating:
@@ -844,34 +979,18 @@ class ReviewListCreateView(generics.ListCreateAPIView):
         return queryset
 
     def list(self, request, *args, **kwargs):
-        """Return paginated reviews plus meta stats (distribution, total, average)."""
-        product_id = self.kwargs.get('product_id')
-        # Compute meta from approved reviews for the product (ignore rating filter)
-        base_qs = Review.objects.filter(product_id=product_id, status='approved')
-        counts = {i: 0 for i in range(1, 6)}
-        # Aggregate counts per rating
-        from django.db.models import Count as DJCount
-        agg = base_qs.values('rating').annotate(c=DJCount('id'))
-        total = 0
-        for row in agg:
-            r = int(row['rating'])
-            c = int(row['c'])
-            counts[r] = c
-            total += c
-        # Average
-        avg = base_qs.aggregate(a=Avg('rating')).get('a') or 0
+        """Return paginated reviews plus meta stats (distribution, total, average).
 
+        The stats cover every approved review of the product (ignoring the
+        rating filter) and come from the cached review_summary.
+        """
+        meta = review_summary(self.kwargs.get('product_id'))
         queryset = self.get_queryset()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             response = self.get_paginated_response(serializer.data)
-            # attach meta
-            response.data['meta'] = {
-                'counts': counts,
-                'total': total,
-                'average': round(float(avg), 1) if avg else 0,
-            }
+            response.data['meta'] = meta
             return response
         serializer = self.get_serializer(queryset, many=True)
         data = {
@@ -879,11 +998,7 @@ class ReviewListCreateView(generics.ListCreateAPIView):
             'count': len(serializer.data),
             'next': None,
             'previous': None,
-            'meta': {
-                'counts': counts,
-                'total': total,
-                'average': round(float(avg), 1) if avg else 0,
-            }
+            'meta': meta,
         }
         return Response(data)
     
@@ -901,26 +1016,14 @@ class ReviewListCreateView(generics.ListCreateAPIView):
 @permission_classes([permissions.IsAuthenticated])
 def review_toggle_helpful(request, pk: int):
     """Toggle helpful vote for a review by the authenticated user."""
-    try:
-        review = Review.objects.get(pk=pk, status='approved')
-    except Review.DoesNotExist:
+    toggled = toggle_helpful_vote(pk, request.user.pk)
+    if toggled is None:
         return Response({'error': 'Review not found or not approved'}, status=status.HTTP_404_NOT_FOUND)
+    helpful_count, voted, product_slug = toggled
 
-    existing = ReviewHelpfulVote.objects.filter(review=review, user=request.user).first()
-    if existing:
-        # remove vote
-        existing.delete()
-        Review.objects.filter(pk=review.pk).update(helpful_count=F('helpful_count') - 1)
-        review.refresh_from_db(fields=['helpful_count'])
-        voted = False
-    else:
-        # add vote
-        ReviewHelpfulVote.objects.create(review=review, user=request.user)
-        Review.objects.filter(pk=review.pk).update(helpful_count=F('helpful_count') + 1)
-        review.refresh_from_db(fields=['helpful_count'])
-        voted = True
-
-    return Response({'helpful_count': review.helpful_count, 'user_has_voted_helpful': voted})
+    # helpful_count is rendered in the product's detail payload only
+    invalidate_product_detail(product_slug)
+    return Response({'helpful_count': helpful_count, 'user_has_voted_helpful': voted})
 
 
 class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -930,15 +1033,28 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (ImageMultiPartParser, FormParser, JSONParser)
     
     def get_queryset(self):
         # Only allow owners to update/delete; reads require auth due to get_queryset scoping
         if self.request.user and self.request.user.is_authenticated:
-            return Review.objects.filter(user=self.request.user)
+            queryset = Review.objects.filter(user=self.request.user)
+            if self.request.method not in permissions.SAFE_METHODS:
+                # Writes lock the row (see update/destroy) so the rating
+                # signals compute their delta from its committed state
+                queryset = queryset.select_for_update()
+            return queryset
         # Anonymous users shouldn't access this detail endpoint
         return Review.objects.none()
 
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
 
 @api_view(['GET'])
 @permission_classes([IsAdmin])
@@ -984,21 +1100,67 @@ def review_moderate(request, pk: int):
     if action not in ['approve', 'reject']:
         return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        review = Review.objects.get(pk=pk)
-    except Review.DoesNotExist:
-        return Response({'error': 'Review not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Review row and the product's rating aggregates change together. The
+    # row lock makes concurrent moderations of one review take turns, so
+    # each rating delta is computed from the previous one's committed status
+    with transaction.atomic():
+        try:
+            review = Review.objects.select_for_update().get(pk=pk)
+        except Review.DoesNotExist:
+            return Response({'error': 'Review not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if action == 'approve':
-        review.status = 'approved'
-        review.moderation_notes = ''
-    else:
-        review.status = 'rejected'
-        review.moderation_notes = notes
+        if action == 'approve':
+            review.status = 'approved'
+            review.moderation_notes = ''
+        else:
+            review.status = 'rejected'
+            review.moderation_notes = notes
+
+        review.moderated_by = request.user
+        review.moderated_at = timezone.now()
+        review.admin_seen = True
+        review.save()
+
+    return Response(ReviewSerializer(review, context={'request': request}).data)
+
+
+# Largest id list accepted by review_bulk_moderate
+BULK_MODERATION_LIMIT = 500
 
-    review.moderated_by = request.user
-    review.moderated_at = timezone.now()
-    review.admin_seen = True
-    review.save()
 
-    return Response(ReviewSerializer(review, context={'request': request}).data)
\ No newline at end of file
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def review_bulk_moderate(request):
+    """Admin endpoint to approve or reject many reviews at once.
+
+    Body: ``{"ids": [...], "action": "approve" | "reject", "notes": ""}``.
+    The reviews and their moderation metadata are written in one UPDATE;
+    rating aggregates are then rebuilt once per affected product instead of
+    once per review, and the affected caches are dropped together.
+    """
+    action = request.data.get('action')
+    notes = request.data.get('notes', '')
+    ids = request.data.get('ids')
+    if action not in ['approve', 'reject']:
+        return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(ids, list) or not ids or len(ids) > BULK_MODERATION_LIMIT:
+        return Response(
+            {'error': f'ids must be a list of 1 to {BULK_MODERATION_LIMIT} review ids'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        ids = {int(pk) for pk in ids}
+    except (TypeError, ValueError):
+        return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    updated, found, product_ids = moderate_reviews(
+        Review.objects.filter(pk__in=ids),
+        'approved' if action == 'approve' else 'rejected',
+        request.user,
+        notes='' if action == 'approve' else notes,
+    )
+    return Response({
+        'updated': updated,
+        'products': len(product_ids),
+        'missing': sorted(ids - found),
+    })
\ No newline at end of file